@@ -0,0 +1,135 @@
+"""
+End-to-end benchmark of CodeInterpreterSession without network access.
+
+    python benchmarks/run_benchmark.py --sessions 8 --turns 5 --json
+
+Every turn the scripted model lets the agent run one piece of code,
+which reads the uploaded dataset and writes a result file,
+and then answers with a download link to it.
+Exits with status 1 if one of the --max-* thresholds is exceeded,
+so it can gate a release.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the offline fakes are shared with the test suite
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+from fakes import FakeCodeBox, ScriptedChatModel  # noqa: E402
+
+from gpt_code_interpreter import CodeBoxPool, CodeInterpreterSession, File  # noqa: E402
+
+SCRIPT = [
+    {
+        "code": (
+            "with open('dataset.csv') as f:\n"
+            "    rows = f.read().splitlines()\n"
+            "with open('result.csv', 'w') as f:\n"
+            "    f.write('\\n'.join(rows[:10]))\n"
+            "print(len(rows))"
+        )
+    },
+    "I saved the first rows to result.csv. "
+    "You can [download it here](sandbox:/mnt/data/result.csv).",
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+def dataset(size: int) -> bytes:
+    row = b"1.0,2.0,3.0,4.0,setosa\n"
+    return row * max(size // len(row), 1)
+
+
+async def run_session(
+    pool: CodeBoxPool, args: argparse.Namespace, latencies: list[float]
+) -> int:
+    llm = ScriptedChatModel(
+        script=SCRIPT, latency=args.llm_latency, openai_api_key="benchmark"
+    )  # type: ignore
+    files = [File(name="dataset.csv", content=dataset(args.file_size))]
+    async with CodeInterpreterSession(llm=llm, pool=pool) as session:
+        for _ in range(args.turns):
+            start = time.perf_counter()
+            response = await session.generate_response("Summarize it.", files=files)
+            latencies.append(time.perf_counter() - start)
+            assert response.files, "the result file did not get downloaded"
+    return llm.calls
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, float]:
+    boxes: list[FakeCodeBox] = []
+
+    def factory() -> FakeCodeBox:
+        boxes.append(FakeCodeBox(latency=args.box_latency))
+        return boxes[-1]
+
+    latencies: list[float] = []
+    async with CodeBoxPool(
+        min_size=args.sessions, max_size=args.sessions, factory=factory
+    ) as pool:
+        start = time.perf_counter()
+        calls = await asyncio.gather(
+            *(run_session(pool, args, latencies) for _ in range(args.sessions))
+        )
+        elapsed = time.perf_counter() - start
+
+    turns = len(latencies)
+    return {
+        "turns": turns,
+        "turns_per_second": turns / elapsed,
+        "p50_turn_seconds": percentile(latencies, 50),
+        "p95_turn_seconds": percentile(latencies, 95),
+        "llm_calls_per_turn": sum(calls) / turns,
+        "bytes_uploaded": sum(box.bytes_uploaded for box in boxes),
+        "bytes_downloaded": sum(box.bytes_downloaded for box in boxes),
+        # kilobytes on linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--box-latency", type=float, default=0.005)
+    parser.add_argument("--file-size", type=int, default=1024 * 1024)
+    parser.add_argument("--max-p95", type=float)
+    parser.add_argument("--max-llm-calls-per-turn", type=float)
+    parser.add_argument("--max-peak-rss-mb", type=float)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key:>20}: {value:.4g}")
+
+    limits = {
+        "p95_turn_seconds": args.max_p95,
+        "llm_calls_per_turn": args.max_llm_calls_per_turn,
+        "peak_rss_mb": args.max_peak_rss_mb,
+    }
+    exceeded = [
+        key for key, limit in limits.items()
+        if limit is not None and results[key] > limit
+    ]
+    if exceeded:
+        print(f"Exceeded: {', '.join(exceeded)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,8 @@
 from gpt_code_interpreter.session import CodeInterpreterSession
+from gpt_code_interpreter.manager import SessionManager
 from gpt_code_interpreter.schema import File
+from gpt_code_interpreter.codebox import CodeBoxPool
+from gpt_code_interpreter.cache import InMemoryLLMCache, SQLiteLLMCache
+from gpt_code_interpreter.scheduler import LLMScheduler, RateLimit
+from gpt_code_interpreter.store import LocalSessionStore, SQLiteSessionStore
+from gpt_code_interpreter.tracing import InMemoryCollector, PrometheusExporter, Tracer
@@ -10,9 +10,9 @@ Credits go to the original authors :)
 import json
 from dataclasses import dataclass
 from json import JSONDecodeError
-from typing import Any, List, Optional, Sequence, Tuple, Union
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
-from pydantic import root_validator
+from pydantic import PrivateAttr, root_validator
 
 from langchain.agents import BaseSingleActionAgent
 from langchain.base_language import BaseLanguageModel
@@ -27,6 +27,8 @@ from langchain.prompts.chat import (
     MessagesPlaceholder,
 )
 from langchain.schema import (
+    messages_from_dict,
+    messages_to_dict,
     AgentAction,
     AgentFinish,
     AIMessage,
@@ -39,6 +41,10 @@ from langchain.schema import (
 from langchain.tools import BaseTool
 from langchain.tools.convert_to_openai import format_tool_to_openai_function
 
+from gpt_code_interpreter.cache import LLMCache
+from gpt_code_interpreter.scheduler import INTERACTIVE, call_llm
+from gpt_code_interpreter.tracing import count_tokens, is_tracing, span
+
 
 @dataclass
 class _FunctionsAgentAction(AgentAction):
@@ -107,6 +113,48 @@ def _format_intermediate_steps(
     return messages
 
 
+def _truncate(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Keep the head and the tail of a text, roughly max_tokens in total."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = len(text) * max_tokens // tokens // 2
+    return f"{text[:keep]}\n[... {tokens - max_tokens} tokens truncated ...]\n{text[-keep:]}"
+
+
+def _compact_intermediate_steps(
+    intermediate_steps: List[Tuple[AgentAction, str]],
+    max_tokens: int,
+    keep_recent: int,
+    count_tokens: Callable[[str], int],
+    truncate_to: int = 64,
+) -> Tuple[List[Tuple[AgentAction, str]], int]:
+    """Truncate the oldest observations until all of them fit into max_tokens.
+    Args:
+        intermediate_steps: Steps the LLM has taken to date, along with observations
+        max_tokens: Token budget for all observations
+        keep_recent: Number of most recent steps that are never truncated
+        count_tokens: Function to count the tokens of a text
+        truncate_to: Tokens an old observation gets truncated to
+    Returns:
+        compacted steps and the number of tokens saved
+    """
+    observations = [str(observation) for _, observation in intermediate_steps]
+    counts = [count_tokens(observation) for observation in observations]
+    total = sum(counts)
+    saved = 0
+    steps = list(intermediate_steps)
+    for i in range(max(len(steps) - keep_recent, 0)):
+        if total - saved <= max_tokens:
+            break
+        if counts[i] <= truncate_to:
+            continue
+        truncated = _truncate(observations[i], truncate_to, count_tokens)
+        saved += counts[i] - count_tokens(truncated)
+        steps[i] = (steps[i][0], truncated)
+    return steps, saved
+
+
 async def _parse_ai_message(
     message: BaseMessage, llm: BaseLanguageModel
 ) -> Union[AgentAction, AgentFinish]:
@@ -171,6 +219,22 @@ class OpenAIFunctionsAgent(BaseSingleActionAgent):
     llm: BaseLanguageModel
     tools: Sequence[BaseTool]
     prompt: BasePromptTemplate
+    scratchpad_max_tokens: Optional[int] = None
+    """Token budget for the observations replayed in the agent_scratchpad."""
+    scratchpad_keep_recent: int = 2
+    """Number of most recent steps whose observations are never truncated."""
+    scratchpad_tokens_saved: int = 0
+    """Tokens saved by scratchpad compaction so far."""
+    llm_cache: Optional[LLMCache] = None
+    """Replay plans for identical prompts (only sensible for deterministic models)."""
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    # (ids of the tools, their function schemas)
+    _functions: Optional[Tuple[Tuple[int, ...], List[dict]]] = PrivateAttr(
+        default=None
+    )
 
     def get_allowed_tools(self) -> List[str]:
         """Get allowed tools."""
@@ -197,9 +261,19 @@ class OpenAIFunctionsAgent(BaseSingleActionAgent):
         """Get input keys. Input refers to user input here."""
         return ["input"]
 
+    def _count_tokens(self, text: str) -> int:
+        return count_tokens(self.llm, text)
+
     @property
     def functions(self) -> List[dict]:
-        return [dict(format_tool_to_openai_function(t)) for t in self.tools]
+        """Function schemas of the tools, rebuilt only when the tools change."""
+        key = tuple(id(t) for t in self.tools)
+        if self._functions is None or self._functions[0] != key:
+            self._functions = (
+                key,
+                [dict(format_tool_to_openai_function(t)) for t in self.tools],
+            )
+        return self._functions[1]
 
     def plan(self):
         raise NotImplementedError
@@ -220,6 +294,15 @@ class OpenAIFunctionsAgent(BaseSingleActionAgent):
         Returns:
             Action specifying what tool to use.
         """
+        saved = 0
+        if self.scratchpad_max_tokens is not None:
+            intermediate_steps, saved = _compact_intermediate_steps(
+                intermediate_steps,
+                max_tokens=self.scratchpad_max_tokens,
+                keep_recent=self.scratchpad_keep_recent,
+                count_tokens=self._count_tokens,
+            )
+            self.scratchpad_tokens_saved += saved
         agent_scratchpad = _format_intermediate_steps(intermediate_steps)
         selected_inputs = {
             k: kwargs[k] for k in self.prompt.input_variables if k != "agent_scratchpad"
@@ -227,10 +310,38 @@ class OpenAIFunctionsAgent(BaseSingleActionAgent):
         full_inputs = dict(**selected_inputs, agent_scratchpad=agent_scratchpad)
         prompt = self.prompt.format_prompt(**full_inputs)
         messages = prompt.to_messages()
-        predicted_message = await self.llm.apredict_messages(
-            messages, functions=self.functions, callbacks=callbacks
-        )
+        key = None
+        if self.llm_cache is not None:
+            key = self.llm_cache.key(
+                self.llm,
+                json.dumps([messages_to_dict(messages), self.functions]),
+            )
+            if (cached := await self.llm_cache.alookup(key)) is not None:
+                (predicted_message,) = messages_from_dict(json.loads(cached))
+                return await _parse_ai_message(predicted_message, self.llm)
+        prompt_text = "\n".join(str(m.content) for m in messages)
+        with span(
+            "agent.plan", steps=len(intermediate_steps), scratchpad_tokens_saved=saved
+        ) as s:
+            predicted_message = await call_llm(
+                self.llm,
+                lambda: self.llm.apredict_messages(
+                    messages, functions=self.functions, callbacks=callbacks
+                ),
+                prompt_text,
+                INTERACTIVE,
+            )
+            if is_tracing():
+                s.attributes["prompt_tokens"] = self._count_tokens(prompt_text)
+                s.attributes["completion_tokens"] = self._count_tokens(
+                    predicted_message.content
+                    + json.dumps(predicted_message.additional_kwargs)
+                )
         agent_decision = await _parse_ai_message(predicted_message, self.llm)
+        if key is not None:
+            await self.llm_cache.aupdate(  # type: ignore
+                key, json.dumps(messages_to_dict([predicted_message]))
+            )
         return agent_decision
 
     @classmethod
@@ -0,0 +1,187 @@
+"""
+Exact-match cache for LLM responses.
+
+The auxiliary chains (file modifications, download link removal)
+are pure functions of their prompt, so identical prompts
+to the same model can be answered from the cache:
+
+    session = CodeInterpreterSession(llm_cache=InMemoryLLMCache(ttl=3600))
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+def model_name(llm: Any) -> str:
+    return (
+        getattr(llm, "model_name", None)
+        or getattr(llm, "model", None)
+        or llm.__class__.__name__
+    )
+
+
+class LLMCache(ABC):
+    """Maps a (model name, prompt) key to the response text."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(llm: Any, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name(llm)}\0{prompt}".encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def update(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    async def alookup(self, key: str) -> Optional[str]:
+        return self.lookup(key)
+
+    async def aupdate(self, key: str, value: str) -> None:
+        self.update(key, value)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class InMemoryLLMCache(LLMCache):
+    """Least recently used entries get evicted above max_size."""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None) -> None:
+        super().__init__(max_size, ttl)
+        # key -> (created, value)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[0]):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteLLMCache(LLMCache):
+    """
+    Persistent cache that can be shared between processes.
+    Least recently used entries get evicted above max_size.
+    """
+
+    def __init__(
+        self,
+        path: str = "codeinterpreter_llm_cache.db",
+        max_size: int = 100_000,
+        ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(max_size, ttl)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # one connection per call, so the cache can be used from worker threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    async def alookup(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.lookup, key)
+
+    async def aupdate(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self.update, key, value)
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1]):
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            (size,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if size > self.max_size:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                    (size - self.max_size,),
+                )
+                self.evictions += size - self.max_size
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
@@ -6,28 +6,43 @@ from langchain.chat_models.openai import ChatOpenAI
 from langchain.chat_models.anthropic import ChatAnthropic
 from langchain.schema import AIMessage, OutputParserException
 
+from gpt_code_interpreter.cache import LLMCache
 from gpt_code_interpreter.prompts import determine_modifications_prompt
+from gpt_code_interpreter.scheduler import AUXILIARY, call_llm
+from gpt_code_interpreter.tracing import count_tokens, is_tracing, span
 
 
 async def get_file_modifications(
     code: str,
     llm: BaseLanguageModel,
     retry: int = 2,
+    cache: Optional[LLMCache] = None,
 ) -> Optional[List[str]]:
     if retry < 1:
         return None
 
     prompt = determine_modifications_prompt.format(code=code)
-
-    result = await llm.apredict(prompt, stop="```")
-
+    key = cache.key(llm, prompt) if cache is not None else None
+    if cache is not None and (cached := await cache.alookup(key)) is not None:  # type: ignore
+        return json.loads(cached)
+
+    with span("chain.get_file_modifications") as s:
+        result = await call_llm(
+            llm, lambda: llm.apredict(prompt, stop="```"), prompt, AUXILIARY
+        )
+        if is_tracing():
+            s.attributes["prompt_tokens"] = count_tokens(llm, prompt)
+            s.attributes["completion_tokens"] = count_tokens(llm, result)
 
     try:
         result = json.loads(result)
     except json.JSONDecodeError:
         result = ""
     if not result or not isinstance(result, dict) or "modifications" not in result:
-        return await get_file_modifications(code, llm, retry=retry - 1)
+        return await get_file_modifications(code, llm, retry=retry - 1, cache=cache)
+    # only valid answers get cached, so a retry asks the LLM again
+    if cache is not None:
+        await cache.aupdate(key, json.dumps(result["modifications"]))  # type: ignore
     return result["modifications"]
 
 
@@ -1,20 +1,38 @@
+from typing import Optional
+
 from langchain.base_language import BaseLanguageModel
 from langchain.chat_models.openai import ChatOpenAI
 from langchain.schema import AIMessage, OutputParserException
 
+from gpt_code_interpreter.cache import LLMCache
 from gpt_code_interpreter.prompts import remove_dl_link_prompt
+from gpt_code_interpreter.scheduler import AUXILIARY, call_llm
+from gpt_code_interpreter.tracing import count_tokens, is_tracing, span
 
 
 async def remove_download_link(
     input_response: str,
     llm: BaseLanguageModel,
+    cache: Optional[LLMCache] = None,
 ) -> str:
     messages = remove_dl_link_prompt.format_prompt(input_response=input_response).to_messages()
-    message = await llm.apredict_messages(messages)
+    prompt = "\n".join(str(m.content) for m in messages)
+    key = cache.key(llm, prompt) if cache is not None else None
+    if cache is not None and (cached := await cache.alookup(key)) is not None:  # type: ignore
+        return cached
+    with span("chain.remove_download_link") as s:
+        message = await call_llm(
+            llm, lambda: llm.apredict_messages(messages), prompt, AUXILIARY
+        )
+        if is_tracing():
+            s.attributes["prompt_tokens"] = count_tokens(llm, prompt)
+            s.attributes["completion_tokens"] = count_tokens(llm, message.content)
 
     if not isinstance(message, AIMessage):
         raise OutputParserException("Expected an AIMessage")
 
+    if cache is not None:
+        await cache.aupdate(key, message.content)  # type: ignore
     return message.content
 
 
@@ -0,0 +1,5 @@
+from .backend import create_codebox
+from .kernel import KernelBox
+from .pool import CodeBoxPool
+from .process import ProcessBox
+from .warmup import WARMUP_CODE, warm_up
@@ -0,0 +1,5 @@
+# Imported by the forkserver of the ProcessBox before the preloaded
+# modules, so matplotlib gets imported with a non-interactive backend.
+import os
+
+os.environ.setdefault("MPLBACKEND", "Agg")
@@ -0,0 +1,38 @@
+from typing import Optional
+
+from codeboxapi import CodeBox  # type: ignore
+from codeboxapi.config import settings as codebox_settings  # type: ignore
+from gpt_code_interpreter.config import settings
+
+
+def create_codebox(backend: Optional[str] = None) -> CodeBox:
+    """
+    Create a CodeBox of the given backend (CODEBOX_BACKEND by default):
+    "codebox" for the CodeBox API (a LocalBox without CODEBOX_API_KEY)
+    "kernel" for a local Jupyter kernel without the gateway
+    or "process" for stateless runs in pre-forked worker processes.
+    """
+    backend = backend or settings.CODEBOX_BACKEND
+    if backend == "codebox":
+        return CodeBox()
+    if backend == "kernel":
+        from .kernel import KernelBox
+
+        return KernelBox()  # type: ignore
+    if backend == "process":
+        from .process import ProcessBox
+
+        return ProcessBox()  # type: ignore
+    raise ValueError(f"Unknown CodeBox backend: {backend}")
+
+
+def is_local_box(backend: Optional[str] = None) -> bool:
+    """
+    Whether the backend creates the codeboxapi LocalBox, which is a singleton:
+    every CodeBox() returns the same instance and resets its kernel.
+    """
+    backend = backend or settings.CODEBOX_BACKEND
+    return backend == "codebox" and codebox_settings.CODEBOX_API_KEY in (
+        None,
+        "local",
+    )
@@ -0,0 +1,61 @@
+import posixpath
+import re
+from dataclasses import dataclass
+from typing import Literal, Optional, Sequence
+
+import aiohttp
+from codeboxapi.schema import CodeBoxOutput  # type: ignore
+from gpt_code_interpreter.installer import missing_module
+
+# failures of a run that can be fixed without asking the LLM:
+# install the module, restart the kernel, upload the file or connect again
+ErrorKind = Literal["missing_module", "kernel_died", "file_not_uploaded", "transient"]
+
+KERNEL_DIED = (
+    "Kernel died",
+    "DeadKernelError",
+    "Could not connect to kernel",
+)
+
+
+@dataclass
+class RecoverableError:
+    kind: ErrorKind
+    # name of the missing module or file
+    name: Optional[str] = None
+
+
+def classify_output(
+    output: CodeBoxOutput, uploaded_files: Sequence[str] = ()
+) -> Optional[RecoverableError]:
+    """Classify an error output (None if it is not recoverable)."""
+    if output.type != "error":
+        return None
+    if module := missing_module(output.content):
+        return RecoverableError("missing_module", module)
+    if any(message in output.content for message in KERNEL_DIED):
+        return RecoverableError("kernel_died")
+    if match := re.search(
+        r"FileNotFoundError: \[Errno 2\] No such file or directory: '([^']+)'",
+        output.content,
+    ):
+        name = posixpath.normpath(match.group(1))
+        for file_name in uploaded_files:
+            if name == file_name or name.endswith("/" + file_name):
+                return RecoverableError("file_not_uploaded", file_name)
+    return None
+
+
+def classify_exception(e: BaseException) -> Optional[RecoverableError]:
+    """
+    Classify an exception raised by the CodeBox (None if not recoverable).
+    Only failed connections count as transient: after a timeout or a
+    dropped response the code might have run already.
+    """
+    if isinstance(e, RuntimeError) and any(
+        message in str(e) for message in KERNEL_DIED
+    ):
+        return RecoverableError("kernel_died")
+    if isinstance(e, (ConnectionRefusedError, aiohttp.ClientConnectorError)):
+        return RecoverableError("transient")
+    return None
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from queue import Empty
+from typing import TYPE_CHECKING, List, Optional
+
+from codeboxapi.box.basebox import BaseBox  # type: ignore
+from codeboxapi.schema import CodeBoxFile, CodeBoxOutput, CodeBoxStatus  # type: ignore
+from gpt_code_interpreter.config import settings
+
+if TYPE_CHECKING:
+    from jupyter_client import AsyncKernelClient, AsyncKernelManager
+
+# seconds an interrupted run gets to stop before the kernel is restarted
+INTERRUPT_GRACE = 10
+
+
+class KernelBox(BaseBox):
+    """
+    Runs the code in a local Jupyter kernel, talking to it directly over ZMQ
+    with jupyter_client instead of going through jupyter-kernel-gateway.
+    Files are read and written in the working directory of the kernel.
+
+    Only the async interface is implemented.
+    """
+
+    def __init__(
+        self,
+        cwd: Optional[str] = None,
+        kernel_name: str = "python3",
+        startup_timeout: float = 60,
+        max_output_length: int = 500,
+        timeout: float = 300,
+    ) -> None:
+        """
+        Args:
+            cwd: Working directory of the kernel (a new temporary one if None)
+            kernel_name: Name of the kernel spec to start
+            startup_timeout: Seconds to wait for the kernel to get ready
+            max_output_length: Characters of text output kept (the tail)
+            timeout: Wall clock seconds per run, the kernel gets interrupted
+                after that (and restarted if it does not stop)
+        """
+        super().__init__()
+        self.cwd = cwd
+        self.kernel_name = kernel_name
+        self.startup_timeout = startup_timeout
+        self.max_output_length = max_output_length
+        self.timeout = timeout
+        self.km: Optional["AsyncKernelManager"] = None
+        self.kc: Optional["AsyncKernelClient"] = None
+        self._temporary_cwd = False
+        # holds the unix sockets of the kernel, so they don't show up in cwd
+        self._ipc_dir: Optional[str] = None
+        # one execution at a time, so iopub messages are not read concurrently
+        self._lock = asyncio.Lock()
+
+    @property
+    def workdir(self) -> Optional[str]:
+        """Working directory of the kernel on this host."""
+        return self.cwd if self.km is not None else None
+
+    def start(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use astart() with the KernelBox.")
+
+    async def astart(self) -> CodeBoxStatus:
+        try:
+            from jupyter_client import AsyncKernelManager
+        except ImportError:
+            raise ImportError(
+                "Please install it with `pip install gpt_code_interpreter[kernel]` "
+                "to use the kernel backend."
+            )
+        if self.km is not None:
+            return CodeBoxStatus(status="started")
+        if self.cwd is None:
+            self.cwd = tempfile.mkdtemp(prefix="codebox-")
+            self._temporary_cwd = True
+        os.makedirs(self.cwd, exist_ok=True)
+        self.km = AsyncKernelManager(kernel_name=self.kernel_name)
+        if os.name == "posix":
+            # unix sockets instead of tcp on localhost
+            self._ipc_dir = tempfile.mkdtemp(prefix="codebox-ipc-")
+            self.km.transport = "ipc"
+            self.km.ip = os.path.join(self._ipc_dir, "kernel")
+        await self.km.start_kernel(cwd=self.cwd)
+        self.kc = self.km.client()
+        self.kc.start_channels()
+        try:
+            await self.kc.wait_for_ready(timeout=self.startup_timeout)
+        except RuntimeError:
+            await self.astop()
+            raise
+        self._update()
+        return CodeBoxStatus(status="started")
+
+    def status(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use astatus() with the KernelBox.")
+
+    async def astatus(self) -> CodeBoxStatus:
+        running = self.km is not None and await self.km.is_alive()
+        return CodeBoxStatus(status="running" if running else "stopped")
+
+    def run(self, code: Optional[str] = None, file_path=None) -> CodeBoxOutput:
+        raise NotImplementedError("Use arun() with the KernelBox.")
+
+    async def arun(self, code: str, file_path=None) -> CodeBoxOutput:
+        if file_path:
+            raise NotImplementedError("Reading from file is not supported.")
+        if self.kc is None:
+            await self.astart()
+        if settings.VERBOSE:
+            print("Running code:\n", code)
+        async with self._lock:
+            self._update()
+            return await self._execute(code)
+
+    async def _execute(self, code: str) -> CodeBoxOutput:
+        msg_id = self.kc.execute(  # type: ignore
+            code, store_history=True, allow_stdin=False, stop_on_error=True
+        )
+        result = ""
+        display_text: list[str] = []
+        image: Optional[str] = None
+        error: Optional[str] = None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        interrupted = False
+        while True:
+            if loop.time() > deadline:
+                if interrupted:
+                    # e.g. stuck in C code that does not check for signals
+                    await self.arestart()
+                    break
+                await self.km.interrupt_kernel()  # type: ignore
+                interrupted = True
+                deadline = loop.time() + INTERRUPT_GRACE
+            try:
+                msg = await self.kc.get_iopub_msg(timeout=1)  # type: ignore
+            except Empty:
+                if not await self.km.is_alive():  # type: ignore
+                    return CodeBoxOutput(type="error", content="Kernel died")
+                continue
+            if msg["parent_header"].get("msg_id") != msg_id:
+                continue
+            msg_type, content = msg["header"]["msg_type"], msg["content"]
+            if msg_type == "stream":
+                text = content["text"].strip()
+                if "Requirement already satisfied:" not in text:
+                    result += text + "\n"
+            elif msg_type == "execute_result":
+                result += content["data"].get("text/plain", "").strip() + "\n"
+            elif msg_type == "display_data":
+                if "image/png" in content["data"]:
+                    image = image or content["data"]["image/png"]
+                elif "text/plain" in content["data"]:
+                    display_text.append(content["data"]["text/plain"])
+            elif msg_type == "error":
+                error = f"{content['ename']}: {content['evalue']}"
+            elif msg_type == "status" and content["execution_state"] == "idle":
+                break
+
+        if interrupted:
+            return CodeBoxOutput(
+                type="error",
+                content=f"TimeoutError: The code ran longer than {self.timeout}s.",
+            )
+        if error is not None:
+            return CodeBoxOutput(type="error", content=error)
+        if image is not None:
+            return CodeBoxOutput(type="image/png", content=image)
+        if display_text and not result:
+            # displayed data is passed on as is (e.g. the directory snapshot)
+            return CodeBoxOutput(type="text", content="\n".join(display_text))
+        result += "".join(text + "\n" for text in display_text)
+        if len(result) > self.max_output_length:
+            result = "[...]\n" + result[-self.max_output_length :]
+        return CodeBoxOutput(
+            type="text", content=result or "code run successfully (no output)"
+        )
+
+    def _path(self, file_name: str) -> str:
+        if self.cwd is None:
+            raise RuntimeError("The KernelBox is not started.")
+        return os.path.join(self.cwd, file_name)
+
+    def upload(self, file_name: str, content: bytes) -> CodeBoxStatus:
+        path = self._path(file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return CodeBoxStatus(status=f"{file_name} uploaded successfully")
+
+    async def aupload(self, file_name: str, content: bytes) -> CodeBoxStatus:
+        return await asyncio.to_thread(self.upload, file_name, content)
+
+    def download(self, file_name: str) -> CodeBoxFile:
+        with open(self._path(file_name), "rb") as f:
+            return CodeBoxFile(name=file_name, content=f.read())
+
+    async def adownload(self, file_name: str) -> CodeBoxFile:
+        return await asyncio.to_thread(self.download, file_name)
+
+    def install(self, package_name: str) -> CodeBoxStatus:
+        raise NotImplementedError("Use ainstall() with the KernelBox.")
+
+    async def ainstall(self, package_name: str) -> CodeBoxStatus:
+        await self.arun(f"%pip install -q {package_name}")
+        return CodeBoxStatus(status=f"{package_name} installed successfully")
+
+    def list_files(self) -> List[CodeBoxFile]:
+        return [
+            CodeBoxFile(name=file_name, content=None)
+            for file_name in os.listdir(self._path(""))
+        ]
+
+    async def alist_files(self) -> List[CodeBoxFile]:
+        return await asyncio.to_thread(self.list_files)
+
+    def restart(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use arestart() with the KernelBox.")
+
+    async def arestart(self) -> CodeBoxStatus:
+        if self.km is None:
+            await self.astart()
+        else:
+            await self.km.restart_kernel()
+            await self.kc.wait_for_ready(timeout=self.startup_timeout)  # type: ignore
+        return CodeBoxStatus(status="restarted")
+
+    def stop(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use astop() with the KernelBox.")
+
+    async def astop(self) -> CodeBoxStatus:
+        if self.kc is not None:
+            self.kc.stop_channels()
+            self.kc = None
+        if self.km is not None:
+            await self.km.shutdown_kernel(now=True)
+            self.km = None
+        if self._ipc_dir is not None:
+            shutil.rmtree(self._ipc_dir, ignore_errors=True)
+            self._ipc_dir = None
+        if self._temporary_cwd and self.cwd is not None:
+            shutil.rmtree(self.cwd, ignore_errors=True)
+            self.cwd = None
+            self._temporary_cwd = False
+        return CodeBoxStatus(status="stopped")
@@ -0,0 +1,246 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+from codeboxapi import CodeBox  # type: ignore
+from codeboxapi.box.localbox import LocalBox  # type: ignore
+from gpt_code_interpreter.codebox.backend import create_codebox, is_local_box
+from gpt_code_interpreter.codebox.warmup import warm_up, warmup_code
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.tracing import Tracer, use_tracer
+
+
+class CodeBoxPool:
+    """
+    Keeps a number of started CodeBoxes warm so a session
+    can check one out without booting a kernel on the request path.
+
+    The LocalBox (CodeBox without CODEBOX_API_KEY) is a single shared
+    instance and can not be pooled, use the "kernel" or "process"
+    backend (CODEBOX_BACKEND) on a single host instead.
+
+    Usage:
+        pool = CodeBoxPool(min_size=2, max_size=8)
+        await pool.astart()
+        session = CodeInterpreterSession(pool=pool)
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 4,
+        idle_ttl: Optional[float] = 60 * 10,
+        health_check_interval: float = 30,
+        factory: Callable[[], CodeBox] = create_codebox,
+        verbose: bool = settings.VERBOSE,
+        warmup: bool = settings.WARMUP,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(
+                f"Invalid pool size: min_size={min_size}, max_size={max_size}"
+            )
+        if factory is create_codebox and is_local_box():
+            raise ValueError(
+                "The LocalBox can not be pooled. Set a CODEBOX_API_KEY or "
+                'use CODEBOX_BACKEND="kernel" or "process".'
+            )
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_check_interval = health_check_interval
+        self.factory = factory
+        self.verbose = verbose
+        self.warmup_code: Optional[str] = warmup_code() if warmup else None
+        self.tracer = tracer
+        # (codebox, idle since) - oldest on the left, checkout pops from the right
+        self._idle: Deque[Tuple[CodeBox, float]] = deque()
+        # idle + starting + checked out boxes
+        self._size = 0
+        self._starting = 0
+        self._available: Optional[asyncio.Event] = None
+        self._maintainer: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    async def astart(self, wait: bool = True) -> None:
+        """Start warming up min_size CodeBoxes (and wait for them by default)."""
+        self._closed = False
+        self._available = asyncio.Event()
+        self._replenish()
+        if self._maintainer is None:
+            self._maintainer = asyncio.create_task(self._maintain())
+        if wait and self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def acquire(self) -> CodeBox:
+        """Check out a started CodeBox, booting one only if none is warm."""
+        if self._closed:
+            raise RuntimeError("CodeBoxPool is closed.")
+        if self._available is None:
+            self._available = asyncio.Event()
+        while True:
+            if self._idle:
+                codebox, _ = self._idle.pop()
+                if not await self._is_healthy(codebox):
+                    # went stale since the last maintenance pass
+                    self._free_slot()
+                    self._spawn(self._stop_codebox(codebox))
+                    self._replenish()
+                    continue
+                self._replenish()
+                return codebox
+            if self._size < self.max_size:
+                self._size += 1
+                try:
+                    codebox = await self._start_codebox()
+                except BaseException:
+                    self._free_slot()
+                    raise
+                self._replenish()
+                return codebox
+            self._available.clear()
+            await self._available.wait()
+            if self._closed:
+                raise RuntimeError("CodeBoxPool is closed.")
+
+    async def release(self, codebox: CodeBox, reuse: bool = False) -> None:
+        """
+        Give a CodeBox back to the pool.
+        By default it gets stopped, because it still holds the
+        variables and files of the previous session.
+        """
+        if reuse and not self._closed and await self._is_healthy(codebox):
+            self._idle.append((codebox, time.monotonic()))
+            if self._available is not None:
+                self._available.set()
+        else:
+            self._free_slot()
+            self._spawn(self._stop_codebox(codebox))
+            self._replenish()
+
+    async def astop(self) -> None:
+        self._closed = True
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            self._maintainer = None
+        idle = [codebox for codebox, _ in self._idle]
+        self._idle.clear()
+        self._size -= len(idle)
+        if self._available is not None:
+            # waiting acquires raise now
+            self._available.set()
+        await asyncio.gather(
+            *(self._stop_codebox(codebox) for codebox in idle),
+            *self._tasks,
+            return_exceptions=True,
+        )
+
+    async def _start_codebox(self) -> CodeBox:
+        codebox = self.factory()
+        if isinstance(codebox, LocalBox):
+            raise ValueError("The LocalBox can not be pooled.")
+        await codebox.astart()
+        if self.warmup_code:
+            try:
+                with use_tracer(self.tracer):
+                    await warm_up(codebox, self.warmup_code)
+            except BaseException:
+                await self._stop_codebox(codebox)
+                raise
+        return codebox
+
+    async def _stop_codebox(self, codebox: CodeBox) -> None:
+        try:
+            await codebox.astop()
+        except Exception as e:
+            if self.verbose:
+                print("Error while stopping CodeBox:", e)
+
+    async def _is_healthy(self, codebox: CodeBox) -> bool:
+        try:
+            return await codebox.astatus() == "running"
+        except Exception:
+            return False
+
+    def _free_slot(self) -> None:
+        """Lower the size and wake up the acquires waiting for a slot."""
+        self._size -= 1
+        if self._available is not None:
+            self._available.set()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _replenish(self) -> None:
+        """Boot CodeBoxes in the background until min_size are warm."""
+        if self._closed:
+            return
+        while (
+            len(self._idle) + self._starting < self.min_size
+            and self._size < self.max_size
+        ):
+            self._size += 1
+            self._starting += 1
+            self._spawn(self._warm_up())
+
+    async def _warm_up(self) -> None:
+        try:
+            codebox = await self._start_codebox()
+        except BaseException as e:
+            self._free_slot()
+            if not isinstance(e, Exception):
+                raise
+            if self.verbose:
+                print("Error while warming up CodeBox:", e)
+            return
+        finally:
+            self._starting -= 1
+        if self._closed:
+            self._free_slot()
+            await self._stop_codebox(codebox)
+            return
+        self._idle.append((codebox, time.monotonic()))
+        if self._available is not None:
+            self._available.set()
+
+    async def _maintain(self) -> None:
+        """Drop unhealthy and expired idle CodeBoxes, then top the pool up."""
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            now = time.monotonic()
+            checked = list(self._idle)
+            healthy = await asyncio.gather(
+                *(self._is_healthy(codebox) for codebox, _ in checked)
+            )
+            keep = len(checked) - self.min_size
+            for (codebox, since), ok in zip(checked, healthy):
+                if (codebox, since) not in self._idle:
+                    # checked out while we were waiting for the health checks
+                    continue
+                expired = self.idle_ttl is not None and now - since > self.idle_ttl
+                if not ok or (expired and keep > 0):
+                    if ok:
+                        keep -= 1
+                    self._idle.remove((codebox, since))
+                    self._free_slot()
+                    self._spawn(self._stop_codebox(codebox))
+            self._replenish()
+
+    async def __aenter__(self) -> "CodeBoxPool":
+        await self.astart()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.astop()
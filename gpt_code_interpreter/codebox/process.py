@@ -0,0 +1,314 @@
+import ast
+import asyncio
+import base64
+import io
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import traceback
+from collections import deque
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing.connection import Connection
+from typing import Any, Deque, List, Optional, Sequence, Tuple
+
+from codeboxapi.box.basebox import BaseBox  # type: ignore
+from codeboxapi.schema import CodeBoxFile, CodeBoxOutput, CodeBoxStatus  # type: ignore
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.installer import packages_dir, run_pip
+
+PRELOAD = (
+    "numpy",
+    "pandas",
+    "matplotlib",
+    "matplotlib.pyplot",
+)
+
+
+def _run(code: str) -> dict[str, Any]:
+    """Execute the code like a notebook cell and collect its outputs."""
+    stdout = io.StringIO()
+    namespace: dict[str, Any] = {"__name__": "__main__"}
+    result: dict[str, Any] = {}
+    with redirect_stdout(stdout), redirect_stderr(stdout):
+        try:
+            tree = ast.parse(code)
+            # the value of a trailing expression gets printed, like in a notebook
+            last = None
+            if tree.body and isinstance(tree.body[-1], ast.Expr):
+                last = tree.body.pop()
+            exec(compile(tree, "<cell>", "exec"), namespace)
+            if last is not None:
+                value = eval(
+                    compile(ast.Expression(last.value), "<cell>", "eval"), namespace
+                )
+                if value is not None:
+                    print(repr(value))
+        except BaseException as e:
+            result["error"] = f"{e.__class__.__name__}: {e}"
+            if settings.VERBOSE:
+                traceback.print_exc()
+    result["stdout"] = stdout.getvalue()
+    if "matplotlib.pyplot" in sys.modules:
+        plt = sys.modules["matplotlib.pyplot"]
+        for number in plt.get_fignums():
+            png = io.BytesIO()
+            plt.figure(number).savefig(png, format="png")
+            result["image"] = base64.b64encode(png.getvalue()).decode()
+            break
+        plt.close("all")
+    return result
+
+
+def _worker(conn: Connection) -> None:
+    """Waits for a single job, runs it with resource limits and exits."""
+    try:
+        cwd, packages, code, cpu_limit, memory_limit = conn.recv()
+    except EOFError:
+        return
+    os.chdir(cwd)
+    sys.path.insert(0, cwd)
+    import resource
+    import site
+
+    # after the packages of the host python
+    site.addsitedir(packages)
+
+    if cpu_limit is not None:
+        # SIGXCPU at the soft limit, SIGKILL at the hard one
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    conn.send(_run(code))
+    conn.close()
+
+
+class ProcessBox(BaseBox):
+    """
+    Runs every piece of code in a fresh worker process, forked from
+    a forkserver with the scientific stack already imported.
+    A few workers are forked in advance, so a run does not wait for one.
+
+    Runs are stateless: variables are not preserved between them,
+    only the files in the working directory are.
+    Only the async interface is implemented (POSIX only).
+    """
+
+    stateless = True
+
+    def __init__(
+        self,
+        cwd: Optional[str] = None,
+        workers: int = 2,
+        preload: Sequence[str] = PRELOAD,
+        cpu_limit: Optional[int] = 120,
+        memory_limit: Optional[int] = 4 * 1024**3,
+        timeout: float = 300,
+        max_output_length: int = 500,
+        packages: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            cwd: Working directory of the runs (a new temporary one if None)
+            workers: Worker processes forked in advance
+            preload: Modules imported by the forkserver
+            cpu_limit: CPU seconds per run (RLIMIT_CPU)
+            memory_limit: Bytes of address space per run (RLIMIT_AS)
+            timeout: Wall clock seconds per run
+            max_output_length: Characters of text output kept (the tail)
+            packages: Where ainstall() installs to (SANDBOX_PACKAGES if None)
+        """
+        super().__init__()
+        self.cwd = cwd
+        self.workers = workers
+        self.preload = list(preload)
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self.max_output_length = max_output_length
+        self.packages = packages_dir(packages)
+        self._idle: Deque[Tuple[multiprocessing.process.BaseProcess, Connection]] = (
+            deque()
+        )
+        self._tasks: set[asyncio.Task] = set()
+        self._temporary_cwd = False
+        self._started = False
+
+    @property
+    def workdir(self) -> Optional[str]:
+        """Working directory of the runs on this host."""
+        return self.cwd if self._started else None
+
+    def _spawn(self) -> Tuple[multiprocessing.process.BaseProcess, Connection]:
+        ctx = multiprocessing.get_context("forkserver")
+        # only takes effect before the forkserver is started
+        ctx.set_forkserver_preload(
+            ["gpt_code_interpreter.codebox._preload", *self.preload, __name__]
+        )
+        conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    def _replenish(self) -> None:
+        async def spawn() -> None:
+            worker = await asyncio.to_thread(self._spawn)
+            if self._started:
+                self._idle.append(worker)
+            else:
+                self._kill(worker)
+
+        missing = self.workers - len(self._idle) - len(self._tasks)
+        for _ in range(max(missing, 0)):
+            task = asyncio.create_task(spawn())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _kill(worker: Tuple[multiprocessing.process.BaseProcess, Connection]) -> None:
+        process, conn = worker
+        conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join(timeout=1)
+
+    def start(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use astart() with the ProcessBox.")
+
+    async def astart(self) -> CodeBoxStatus:
+        if self._started:
+            return CodeBoxStatus(status="started")
+        if self.cwd is None:
+            self.cwd = tempfile.mkdtemp(prefix="codebox-")
+            self._temporary_cwd = True
+        os.makedirs(self.cwd, exist_ok=True)
+        self._started = True
+        # the first one also starts the forkserver
+        self._idle.append(await asyncio.to_thread(self._spawn))
+        self._replenish()
+        self._update()
+        return CodeBoxStatus(status="started")
+
+    def status(self) -> CodeBoxStatus:
+        return CodeBoxStatus(status="running" if self._started else "stopped")
+
+    async def astatus(self) -> CodeBoxStatus:
+        return self.status()
+
+    def run(self, code: Optional[str] = None, file_path=None) -> CodeBoxOutput:
+        raise NotImplementedError("Use arun() with the ProcessBox.")
+
+    async def arun(self, code: str, file_path=None) -> CodeBoxOutput:
+        if file_path:
+            raise NotImplementedError("Reading from file is not supported.")
+        if not self._started:
+            await self.astart()
+        if settings.VERBOSE:
+            print("Running code:\n", code)
+        self._update()
+        if self._idle:
+            process, conn = self._idle.popleft()
+        else:
+            process, conn = await asyncio.to_thread(self._spawn)
+        self._replenish()
+        try:
+            conn.send(
+                (self.cwd, self.packages, code, self.cpu_limit, self.memory_limit)
+            )
+            if not await asyncio.to_thread(conn.poll, self.timeout):
+                return CodeBoxOutput(
+                    type="error",
+                    content=f"TimeoutError: The code ran longer than {self.timeout}s.",
+                )
+            result = conn.recv()
+        except (EOFError, OSError):
+            await asyncio.to_thread(process.join, 1)
+            if process.exitcode == -signal.SIGXCPU:
+                reason = f"it used more than {self.cpu_limit}s of CPU time"
+            else:
+                reason = f"exit code {process.exitcode}"
+            return CodeBoxOutput(
+                type="error", content=f"SystemError: The process died ({reason})."
+            )
+        finally:
+            self._kill((process, conn))
+
+        if "error" in result:
+            return CodeBoxOutput(type="error", content=result["error"])
+        if "image" in result:
+            return CodeBoxOutput(type="image/png", content=result["image"])
+        output = result["stdout"]
+        if len(output) > self.max_output_length:
+            output = "[...]\n" + output[-self.max_output_length :]
+        return CodeBoxOutput(
+            type="text", content=output or "code run successfully (no output)"
+        )
+
+    def _path(self, file_name: str) -> str:
+        if self.cwd is None:
+            raise RuntimeError("The ProcessBox is not started.")
+        return os.path.join(self.cwd, file_name)
+
+    def upload(self, file_name: str, content: bytes) -> CodeBoxStatus:
+        path = self._path(file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return CodeBoxStatus(status=f"{file_name} uploaded successfully")
+
+    async def aupload(self, file_name: str, content: bytes) -> CodeBoxStatus:
+        return await asyncio.to_thread(self.upload, file_name, content)
+
+    def download(self, file_name: str) -> CodeBoxFile:
+        with open(self._path(file_name), "rb") as f:
+            return CodeBoxFile(name=file_name, content=f.read())
+
+    async def adownload(self, file_name: str) -> CodeBoxFile:
+        return await asyncio.to_thread(self.download, file_name)
+
+    def install(self, package_name: str) -> CodeBoxStatus:
+        raise NotImplementedError("Use ainstall() with the ProcessBox.")
+
+    async def ainstall(self, package_name: str) -> CodeBoxStatus:
+        """
+        Install into `packages` instead of the python of the host,
+        raises InstallError if pip fails.
+        """
+        await run_pip(
+            "install", "--target", self.packages, package_name, timeout=self.timeout
+        )
+        return CodeBoxStatus(status=f"{package_name} installed successfully")
+
+    def list_files(self) -> List[CodeBoxFile]:
+        return [
+            CodeBoxFile(name=file_name, content=None)
+            for file_name in os.listdir(self._path(""))
+        ]
+
+    async def alist_files(self) -> List[CodeBoxFile]:
+        return await asyncio.to_thread(self.list_files)
+
+    def restart(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use arestart() with the ProcessBox.")
+
+    async def arestart(self) -> CodeBoxStatus:
+        # every run starts from a clean process anyway
+        return CodeBoxStatus(status="restarted")
+
+    def stop(self) -> CodeBoxStatus:
+        raise NotImplementedError("Use astop() with the ProcessBox.")
+
+    async def astop(self) -> CodeBoxStatus:
+        self._started = False
+        for task in list(self._tasks):
+            await task
+        while self._idle:
+            await asyncio.to_thread(self._kill, self._idle.popleft())
+        if self._temporary_cwd and self.cwd is not None:
+            shutil.rmtree(self.cwd, ignore_errors=True)
+            self.cwd = None
+            self._temporary_cwd = False
+        return CodeBoxStatus(status="stopped")
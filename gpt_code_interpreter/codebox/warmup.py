@@ -0,0 +1,71 @@
+import time
+from typing import Optional
+
+from codeboxapi import CodeBox  # type: ignore
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.tracing import span
+
+# Imports the packages advertised in the system prompt, so the first run
+# of a session does not pay for them. Nothing is bound in the namespace.
+WARMUP_CODE = """\
+import importlib as _importlib
+
+try:
+    get_ipython
+except NameError:
+    # outside of a kernel, which renders the plots with its inline backend
+    import matplotlib as _matplotlib
+
+    _matplotlib.use("Agg")
+for _module in (
+    "numpy",
+    "pandas",
+    "matplotlib.pyplot",
+    "seaborn",
+    "scipy",
+    "sklearn",
+    "statsmodels.api",
+):
+    try:
+        _importlib.import_module(_module)
+    except Exception:
+        pass
+try:
+    import pandas as _pd
+
+    _pd.set_option("display.max_rows", 20)
+    _pd.set_option("display.max_columns", 20)
+    _pd.set_option("display.width", 120)
+    del _pd
+except ImportError:
+    pass
+del _importlib, _module
+"""
+
+
+def warmup_code() -> str:
+    """The warm-up script of WARMUP_SCRIPT (the default one if not set)."""
+    if settings.WARMUP_SCRIPT:
+        with open(settings.WARMUP_SCRIPT) as f:
+            return f.read()
+    return WARMUP_CODE
+
+
+async def warm_up(codebox: CodeBox, code: Optional[str]) -> float:
+    """
+    Run the warm-up script in a started CodeBox and return its duration.
+    Stateless CodeBoxes are skipped, since nothing would be kept.
+    """
+    if not code or getattr(codebox, "stateless", False):
+        return 0.0
+    start = time.perf_counter()
+    with span("codebox.warmup", code_bytes=len(code)) as s:
+        output = await codebox.arun(code)
+        if output.type == "error":
+            s.attributes["error"] = output.content
+            if settings.VERBOSE:
+                print("Error while warming up CodeBox:", output.content)
+    duration = time.perf_counter() - start
+    if settings.VERBOSE:
+        print(f"CodeBox warm-up took {duration:.2f}s")
+    return duration
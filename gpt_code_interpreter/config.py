@@ -1,6 +1,6 @@
 from pydantic import BaseSettings
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Literal, Optional
 
 # .env file
 load_dotenv(dotenv_path="./.env")
@@ -16,5 +16,57 @@ class CodeInterpreterAPISettings(BaseSettings):
     CODEBOX_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
 
+    # where the code runs: "codebox" (CodeBox API or a LocalBox
+    # without CODEBOX_API_KEY), "kernel" (local Jupyter kernel over ZMQ)
+    # or "process" (stateless runs in pre-forked worker processes)
+    CODEBOX_BACKEND: Literal["codebox", "kernel", "process"] = "codebox"
+
+    # how to detect files created by the code: diff the sandbox
+    # directory before and after each run, analyze the code statically
+    # or ask the LLM (each one falls back to the next)
+    FILE_DETECTION: Literal["snapshot", "static", "llm"] = "snapshot"
+    SNAPSHOT_HASH_CONTENT: bool = False
+
+    # run a warm-up script (WARMUP_SCRIPT or the default one importing
+    # the scientific stack) when a CodeBox gets started
+    WARMUP: bool = True
+    WARMUP_SCRIPT: Optional[str] = None
+
+    # wheel cache of the packages installed after a ModuleNotFoundError,
+    # shared by the CodeBoxes on this host (INSTALL_OFFLINE: only install from it)
+    WHEELHOUSE: Optional[str] = None
+    INSTALL_OFFLINE: bool = False
+    # these packages get installed into this directory instead of the python
+    # of the host, the local CodeBoxes add it to sys.path after its own packages
+    SANDBOX_PACKAGES: str = "~/.cache/codeinterpreter/packages"
+
+    # how often a run gets fixed (install, upload, reconnect) and run again
+    # before the error goes back to the LLM
+    MAX_RUN_RETRIES: int = 2
+
+    MAX_CONCURRENT_UPLOADS: int = 4
+
+    # File content above this size (bytes) gets spooled to disk
+    FILE_SPOOL_THRESHOLD: int = 16 * 1024 * 1024
+    FILE_CHUNK_SIZE: int = 1024 * 1024
+
+    # token budget for tool outputs replayed to the agent within one turn
+    # (None replays them in full, e.g. 4000 trims long outputs)
+    SCRATCHPAD_MAX_TOKENS: Optional[int] = None
+
+    # conversation memory: keep everything (buffer), the last
+    # MEMORY_WINDOW turns (window), the most recent MEMORY_MAX_TOKENS (token)
+    # or summarize what does not fit into MEMORY_MAX_TOKENS (summary)
+    MEMORY_POLICY: Literal["buffer", "window", "token", "summary"] = "buffer"
+    MEMORY_WINDOW: int = 10
+    MEMORY_MAX_TOKENS: int = 2000
+
+    # also ask the LLM to remove download links the markdown rewriter left over
+    LLM_LINK_REMOVAL: bool = False
+
+    # also answer agent steps from the session's llm_cache
+    # (only sensible with a deterministic model)
+    CACHE_AGENT_PLANS: bool = False
+
 
 settings = CodeInterpreterAPISettings()
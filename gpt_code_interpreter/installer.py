@@ -0,0 +1,315 @@
+"""
+Installation of the packages a CodeBox is missing.
+
+When the code fails with a ModuleNotFoundError, the import name gets mapped
+to its distribution (e.g. sklearn -> scikit-learn) and installed.
+For CodeBoxes running with the python of this host, the other well-known
+packages the code imports and this host is missing get installed as well,
+so the next run does not fail on them. They go into SANDBOX_PACKAGES
+instead of the python of the host, which the runs add to sys.path.
+Installs go through a local wheelhouse, which gets filled on the first
+install, is shared by all local CodeBoxes and can be used offline afterwards:
+
+    installer = InstallManager(wheelhouse="~/.cache/codeinterpreter/wheels")
+    session = CodeInterpreterSession(installer=installer)
+"""
+
+import asyncio
+import importlib.machinery
+import importlib.util
+import json
+import os
+import re
+import socket
+import sys
+from typing import Any, Optional, Sequence
+
+from codeboxapi.box.localbox import LocalBox  # type: ignore
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.tracing import span
+
+# import name -> distribution name of well-known packages.
+# Other imports of a failed cell only get installed if they are listed here.
+IMPORT_TO_DISTRIBUTION = {
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python-headless",
+    "Crypto": "pycryptodome",
+    "dateutil": "python-dateutil",
+    "docx": "python-docx",
+    "dotenv": "python-dotenv",
+    "fitz": "PyMuPDF",
+    "jwt": "PyJWT",
+    "Levenshtein": "python-Levenshtein",
+    "magic": "python-magic",
+    "mpl_toolkits": "matplotlib",
+    "networkx": "networkx",
+    "openpyxl": "openpyxl",
+    "OpenSSL": "pyOpenSSL",
+    "PIL": "Pillow",
+    "plotly": "plotly",
+    "pptx": "python-pptx",
+    "pyarrow": "pyarrow",
+    "scipy": "scipy",
+    "seaborn": "seaborn",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "statsmodels": "statsmodels",
+    "sympy": "sympy",
+    "tabulate": "tabulate",
+    "xlsxwriter": "XlsxWriter",
+    "yaml": "PyYAML",
+}
+
+
+class InstallError(Exception):
+    pass
+
+
+async def run_pip(command: str, *args: str, timeout: float = 600) -> None:
+    """Run pip with the python of this host, raise InstallError if it fails."""
+    process = await asyncio.create_subprocess_exec(
+        *(sys.executable, "-m", "pip", command, "-q", *args),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise InstallError(f"pip {command} took longer than {timeout}s.")
+    if process.returncode != 0:
+        lines = [
+            line
+            for line in stderr.decode(errors="replace").strip().splitlines()
+            if not line.startswith("WARNING:")
+        ]
+        raise InstallError("\n".join(lines[-5:]) or f"pip {command} failed.")
+
+
+def distribution_name(module: str) -> str:
+    module = module.split(".")[0]
+    return IMPORT_TO_DISTRIBUTION.get(module, module)
+
+
+def missing_module(error: str) -> Optional[str]:
+    """Top-level name of the module a ModuleNotFoundError complains about."""
+    if match := re.search(r"ModuleNotFoundError: No module named '([^']+)'", error):
+        return match.group(1).split(".")[0]
+    return None
+
+
+def is_local(codebox: Any) -> bool:
+    """Whether the CodeBox runs the code with the python of this host."""
+    return (
+        isinstance(codebox, LocalBox) or getattr(codebox, "workdir", None) is not None
+    )
+
+
+def _workdir(codebox: Any) -> Optional[str]:
+    if isinstance(codebox, LocalBox):
+        return ".codebox"
+    return getattr(codebox, "workdir", None)
+
+
+def _in_workdir(codebox: Any, module: str) -> bool:
+    """Whether the module is a file or package in the working directory."""
+    workdir = _workdir(codebox)
+    if workdir is None:
+        return False
+    path = os.path.join(workdir, module)
+    return os.path.isdir(path) or os.path.isfile(path + ".py")
+
+
+def packages_dir(path: Optional[str] = None) -> str:
+    """Directory of the packages installed for local CodeBoxes."""
+    return os.path.abspath(os.path.expanduser(path or settings.SANDBOX_PACKAGES))
+
+
+def activate_code(target: str) -> str:
+    """Code that lets a running kernel import the packages of the directory."""
+    return (
+        f"import importlib, site; site.addsitedir({target!r}); "
+        "importlib.invalidate_caches()"
+    )
+
+
+def _importable(module: str, target: Optional[str] = None) -> bool:
+    """Whether the module can be imported on this host (or from the target)."""
+    try:
+        if importlib.util.find_spec(module) is not None:
+            return True
+    except (ImportError, ValueError):
+        pass
+    return (
+        target is not None
+        and importlib.machinery.PathFinder.find_spec(module, [target]) is not None
+    )
+
+
+class InstallManager:
+    """
+    Installs the distributions of missing modules and keeps a record
+    of what got installed on which host,
+    so a distribution that is installed but still can not be imported
+    is reported instead of being installed over and over.
+    """
+
+    def __init__(
+        self,
+        wheelhouse: Optional[str] = None,
+        offline: bool = False,
+        pip_args: Sequence[str] = (),
+        timeout: float = 600,
+        target: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            wheelhouse: Directory of the cached wheels (pip's own cache if None)
+            offline: Only install from the wheelhouse
+            pip_args: Extra arguments of `pip install` and `pip wheel`
+            timeout: Seconds a pip run may take
+            target: Where the packages of local CodeBoxes go (SANDBOX_PACKAGES)
+        """
+        self.wheelhouse = os.path.expanduser(wheelhouse) if wheelhouse else None
+        self.target = packages_dir(target)
+        self.offline = offline
+        self.pip_args = list(pip_args)
+        self.timeout = timeout
+        self.installs = 0
+        # host -> installed distributions
+        self._installed: dict[str, set[str]] = self._load_record()
+        self._lock = asyncio.Lock()
+
+    @property
+    def _record_path(self) -> Optional[str]:
+        if self.wheelhouse is None:
+            return None
+        return os.path.join(self.wheelhouse, "installed.json")
+
+    def _load_record(self) -> dict[str, set[str]]:
+        if self._record_path is None or not os.path.exists(self._record_path):
+            return {}
+        with open(self._record_path) as f:
+            return {host: set(names) for host, names in json.load(f).items()}
+
+    def _save_record(self) -> None:
+        if self._record_path is None:
+            return
+        os.makedirs(self.wheelhouse, exist_ok=True)  # type: ignore
+        with open(self._record_path, "w") as f:
+            json.dump(
+                {host: sorted(names) for host, names in self._installed.items()}, f
+            )
+
+    @staticmethod
+    def host(codebox: Any) -> str:
+        if is_local(codebox):
+            return socket.gethostname()
+        return f"codebox-{codebox.session_id}"
+
+    def installed(self, codebox: Any) -> set[str]:
+        """Distributions installed in the CodeBox by this manager."""
+        return self._installed.get(self.host(codebox), set())
+
+    async def ainstall(
+        self, codebox: Any, module: str, imports: Sequence[str] = ()
+    ) -> list[str]:
+        """
+        Install the distribution of the missing module. For local CodeBoxes
+        the well-known ones of `imports` this host is missing follow,
+        one at a time and skipped if they fail.
+        Returns the installed distributions. Local CodeBoxes have to add
+        `target` to their sys.path (see activate_code) to import them.
+        """
+        host, local = self.host(codebox), is_local(codebox)
+        async with self._lock:
+            distribution = distribution_name(module)
+            if distribution in self._installed.get(host, set()):
+                if not local:
+                    raise InstallError(
+                        f"{distribution} is installed, "
+                        f"but the module {module} can still not be imported."
+                    )
+                if _importable(module, self.target):
+                    # installed before, the kernel only misses the target
+                    return []
+            with span("codebox.install") as s:
+                await self._install(codebox, distribution)
+                installed = [distribution]
+                failed = 0
+                if local:
+                    importlib.invalidate_caches()
+                    for name in imports:
+                        extra = distribution_name(name)
+                        if (
+                            name == module
+                            or name not in IMPORT_TO_DISTRIBUTION
+                            or extra in installed
+                            or _importable(name, self.target)
+                            or _in_workdir(codebox, name)
+                        ):
+                            continue
+                        try:
+                            await self._install(codebox, extra)
+                        except InstallError as e:
+                            failed += 1
+                            if settings.VERBOSE:
+                                print(f"Could not install {extra}:", e)
+                            continue
+                        installed.append(extra)
+                s.attributes.update(packages=len(installed), failed=failed)
+            self.installs += 1
+            self._installed.setdefault(host, set()).update(installed)
+            self._save_record()
+            if settings.VERBOSE:
+                print("Installed:", " ".join(installed))
+            return installed
+
+    async def _install(self, codebox: Any, distribution: str) -> None:
+        if is_local(codebox):
+            await self._pip_install([distribution])
+        else:
+            await codebox.ainstall(distribution)
+
+    async def _pip_install(self, distributions: list[str]) -> None:
+        target = ("--target", self.target)
+        if self.wheelhouse is None:
+            await self._pip("install", *target, *self.pip_args, *distributions)
+            return
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        offline = (*target, "--no-index", "--find-links", self.wheelhouse)
+        try:
+            await self._pip("install", *offline, *self.pip_args, *distributions)
+            return
+        except InstallError:
+            if self.offline:
+                raise
+        # fill the wheelhouse with the distributions and their dependencies
+        await self._pip(
+            "wheel",
+            *("--wheel-dir", self.wheelhouse, "--find-links", self.wheelhouse),
+            *self.pip_args,
+            *distributions,
+        )
+        await self._pip("install", *offline, *self.pip_args, *distributions)
+
+    async def _pip(self, command: str, *args: str) -> None:
+        await run_pip(command, *args, timeout=self.timeout)
+
+
+_default_installer: Optional[InstallManager] = None
+
+
+def default_installer() -> InstallManager:
+    """The InstallManager of WHEELHOUSE shared by the sessions of this process."""
+    global _default_installer
+    if _default_installer is None:
+        _default_installer = InstallManager(
+            wheelhouse=settings.WHEELHOUSE,
+            offline=settings.INSTALL_OFFLINE,
+            target=settings.SANDBOX_PACKAGES,
+        )
+    return _default_installer
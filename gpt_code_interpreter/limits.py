@@ -0,0 +1,93 @@
+"""
+Limits on resources shared between sessions.
+
+LLM calls wait for a slot of the limiter of the current context
+(see `use_llm_limiter`), so the agent and the chains don't need
+a reference to it. Sessions without a limiter are not limited.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+
+
+class ConcurrencyLimit:
+    """A semaphore that keeps track of how much of it is in use."""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.in_use = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    @property
+    def utilization(self) -> float:
+        return self.in_use / self.max_concurrency
+
+
+class BandwidthLimit:
+    """
+    Spaces transfers so that on average no more than
+    `bytes_per_second` get sent.
+    """
+
+    def __init__(self, bytes_per_second: float) -> None:
+        self.bytes_per_second = bytes_per_second
+        self.transferred = 0
+        # when the transfers reserved so far are done
+        self._busy_until = 0.0
+
+    async def acquire(self, size: int) -> None:
+        now = time.monotonic()
+        start = max(now, self._busy_until)
+        self._busy_until = start + size / self.bytes_per_second
+        self.transferred += size
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of the next second that is already reserved."""
+        return min(max(self._busy_until - time.monotonic(), 0.0), 1.0)
+
+
+_current_llm_limiter: ContextVar[Optional[ConcurrencyLimit]] = ContextVar(
+    "codeinterpreter_llm_limiter", default=None
+)
+
+
+@contextmanager
+def use_llm_limiter(limiter: Optional[ConcurrencyLimit]) -> Iterator[None]:
+    """Let the LLM calls run in this context wait for a slot of `limiter`."""
+    token = _current_llm_limiter.set(limiter)
+    try:
+        yield
+    finally:
+        _current_llm_limiter.reset(token)
+
+
+@asynccontextmanager
+async def llm_slot() -> AsyncIterator[None]:
+    """Hold a slot of the current LLM limiter (no-op without one)."""
+    limiter = _current_llm_limiter.get()
+    if limiter is None:
+        yield
+        return
+    async with limiter.slot():
+        yield
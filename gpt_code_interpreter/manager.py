@@ -0,0 +1,267 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from langchain.base_language import BaseLanguageModel
+
+from gpt_code_interpreter.codebox import CodeBoxPool
+from gpt_code_interpreter.codebox.backend import is_local_box
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.limits import BandwidthLimit, ConcurrencyLimit
+from gpt_code_interpreter.schema import CodeInterpreterResponse, File
+from gpt_code_interpreter.session import CodeInterpreterSession
+from gpt_code_interpreter.store import SessionStore
+
+
+@dataclass
+class _ManagedSession:
+    session_id: str
+    # None while the session is evicted to the store
+    session: Optional[CodeInterpreterSession] = None
+    last_used: float = field(default_factory=time.monotonic)
+    busy: bool = False
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SessionManager:
+    """
+    Hosts many logical sessions in one process with global limits
+    on live kernels, in-flight LLM requests and upload bandwidth.
+
+    A session only holds a kernel while it is in use or recently used.
+    Idle sessions get saved to the store and stopped, and resumed from it
+    on their next turn, so the number of logical sessions is only
+    bounded by the store.
+
+    Every session needs its own kernel, so the LocalBox (CodeBox without
+    CODEBOX_API_KEY), a single shared instance, can only be used through
+    a pool with another factory.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        max_live_kernels: int = 16,
+        max_concurrent_llm_requests: int = 32,
+        max_upload_bandwidth: Optional[float] = None,
+        idle_timeout: float = 300,
+        eviction_interval: float = 30,
+        llm: Optional[BaseLanguageModel] = None,
+        pool: Optional[CodeBoxPool] = None,
+        verbose: bool = settings.VERBOSE,
+        **session_kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            store: Where evicted sessions are kept
+            max_live_kernels: Sessions holding a CodeBox at the same time
+            max_concurrent_llm_requests: LLM calls in flight over all sessions
+            max_upload_bandwidth: Bytes per second uploaded over all sessions
+            idle_timeout: Seconds after which an unused session gets evicted
+            eviction_interval: Seconds between the checks for idle sessions
+            llm: Model shared by all sessions (each builds its own if None)
+            pool: CodeBoxPool the sessions check out their CodeBox from
+            verbose: Print the errors of evictions
+            session_kwargs: Passed to every CodeInterpreterSession
+        """
+        if pool is None and is_local_box(session_kwargs.get("codebox_backend")):
+            raise ValueError(
+                "The sessions of a SessionManager can not share the LocalBox. "
+                'Set a CODEBOX_API_KEY or use CODEBOX_BACKEND="kernel" or "process".'
+            )
+        self.store = store
+        self.max_live_kernels = max_live_kernels
+        self.idle_timeout = idle_timeout
+        self.eviction_interval = eviction_interval
+        self.llm = llm
+        self.pool = pool
+        self.verbose = verbose
+        self.session_kwargs = session_kwargs
+        self.llm_limiter = ConcurrencyLimit(max_concurrent_llm_requests)
+        self.upload_limiter = (
+            BandwidthLimit(max_upload_bandwidth) if max_upload_bandwidth else None
+        )
+        self.evictions = 0
+        self.failed_saves = 0
+        self._sessions: dict[str, _ManagedSession] = {}
+        self._live = 0
+        self._kernel_released = asyncio.Condition()
+        self._evictor: Optional[asyncio.Task] = None
+
+    async def astart(self) -> None:
+        if self._evictor is None:
+            self._evictor = asyncio.create_task(self._evict_idle_sessions())
+
+    async def astop(self) -> None:
+        """Evict all sessions, so they can be resumed by another manager."""
+        if self._evictor is not None:
+            self._evictor.cancel()
+            self._evictor = None
+        for entry in list(self._sessions.values()):
+            async with entry.lock:
+                await self._evict(entry)
+
+    def create_session(self, session_id: Optional[str] = None) -> str:
+        """Register a logical session. Its kernel starts with the first turn."""
+        session_id = session_id or str(uuid.uuid4())
+        self._sessions.setdefault(session_id, _ManagedSession(session_id))
+        return session_id
+
+    async def generate_response(
+        self,
+        session_id: str,
+        user_msg: str,
+        files: list[File] = [],
+        detailed_error: bool = False,
+    ) -> CodeInterpreterResponse:
+        """Run a turn of the session, resuming it from the store if evicted."""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[self.create_session(session_id)]
+        try:
+            async with entry.lock:
+                entry.busy = True
+                try:
+                    session = await self._activate(entry)
+                    return await session.generate_response(
+                        user_msg, files=files, detailed_error=detailed_error
+                    )
+                finally:
+                    entry.busy = False
+                    entry.last_used = time.monotonic()
+        finally:
+            # its kernel can be evicted for a waiting session now
+            async with self._kernel_released:
+                self._kernel_released.notify()
+
+    async def close_session(self, session_id: str, delete: bool = False) -> None:
+        """Stop the session and forget about it (and its stored state if delete)."""
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            async with entry.lock:
+                await self._evict(entry, save=not delete)
+        if delete:
+            await self.store.adelete_state(session_id)
+
+    def stats(self) -> dict[str, float]:
+        """Utilization of the shared limits."""
+        stats = {
+            "sessions": len(self._sessions),
+            "live_kernels": self._live,
+            "kernel_utilization": self._live / self.max_live_kernels,
+            "busy_sessions": sum(entry.busy for entry in self._sessions.values()),
+            "evictions": self.evictions,
+            "failed_saves": self.failed_saves,
+            "llm_requests_in_flight": self.llm_limiter.in_use,
+            "llm_requests_waiting": self.llm_limiter.waiting,
+            "llm_utilization": self.llm_limiter.utilization,
+        }
+        if self.upload_limiter is not None:
+            stats["bytes_uploaded"] = self.upload_limiter.transferred
+            stats["upload_utilization"] = self.upload_limiter.utilization
+        return stats
+
+    async def _activate(self, entry: _ManagedSession) -> CodeInterpreterSession:
+        if entry.session is not None:
+            return entry.session
+        await self._acquire_kernel()
+        kwargs = dict(
+            self.session_kwargs,
+            llm=self.llm,
+            pool=self.pool,
+            llm_limiter=self.llm_limiter,
+            upload_limiter=self.upload_limiter,
+        )
+        try:
+            if await self.store.aload_state(entry.session_id) is not None:
+                entry.session = await CodeInterpreterSession.aresume(
+                    entry.session_id, self.store, **kwargs
+                )
+            else:
+                entry.session = CodeInterpreterSession(
+                    session_id=entry.session_id, store=self.store, **kwargs
+                )
+                await entry.session.astart()
+        except BaseException:
+            entry.session = None
+            await self._release_kernel()
+            raise
+        return entry.session
+
+    async def _acquire_kernel(self) -> None:
+        while True:
+            async with self._kernel_released:
+                if self._live < self.max_live_kernels:
+                    self._live += 1
+                    return
+                victim = self._least_recently_used()
+                if victim is None:
+                    await self._kernel_released.wait()
+                    continue
+            # frees a slot, which another waiter might take first
+            async with victim.lock:
+                await self._evict(victim)
+
+    async def _release_kernel(self) -> None:
+        async with self._kernel_released:
+            self._live -= 1
+            self._kernel_released.notify()
+
+    def _least_recently_used(self) -> Optional[_ManagedSession]:
+        idle = [
+            entry
+            for entry in self._sessions.values()
+            if entry.session is not None and not entry.busy and not entry.lock.locked()
+        ]
+        return min(idle, key=lambda entry: entry.last_used, default=None)
+
+    async def _evict(self, entry: _ManagedSession, save: bool = True) -> None:
+        session, entry.session = entry.session, None
+        if session is None:
+            return
+        self.evictions += 1
+        try:
+            if save:
+                await session.asave()
+        except Exception as e:
+            # the session is lost, but the error must not surface
+            # in the unrelated session waiting for its kernel
+            self.failed_saves += 1
+            if self.verbose:
+                print(f"Error while saving session {entry.session_id}:", e)
+        finally:
+            try:
+                await session.astop()
+            except Exception as e:
+                if self.verbose:
+                    print(f"Error while stopping session {entry.session_id}:", e)
+            finally:
+                await self._release_kernel()
+
+    async def _evict_idle_sessions(self) -> None:
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            now = time.monotonic()
+            for entry in list(self._sessions.values()):
+                if (
+                    entry.session is not None
+                    and not entry.busy
+                    and not entry.lock.locked()
+                    and now - entry.last_used > self.idle_timeout
+                ):
+                    try:
+                        async with entry.lock:
+                            await self._evict(entry)
+                    except Exception as e:
+                        # keep evicting the other sessions
+                        if self.verbose:
+                            print(f"Error while evicting {entry.session_id}:", e)
+
+    async def __aenter__(self) -> "SessionManager":
+        await self.astart()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.astop()
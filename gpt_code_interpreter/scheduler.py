@@ -0,0 +1,263 @@
+"""
+Scheduling of LLM requests within the rate limits of the provider.
+
+Sessions sharing an LLMScheduler queue their requests by priority
+instead of retrying into the same rate limits independently:
+
+    scheduler = LLMScheduler({"gpt-4": RateLimit(rpm=200, tpm=40_000)})
+    session = CodeInterpreterSession(llm_scheduler=scheduler)
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from gpt_code_interpreter.cache import model_name
+from gpt_code_interpreter.limits import llm_slot
+from gpt_code_interpreter.tracing import count_tokens
+
+T = TypeVar("T")
+
+# lower runs first
+INTERACTIVE = 0
+AUXILIARY = 10
+
+WINDOW = 60.0
+
+
+@dataclass
+class RateLimit:
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    return (
+        e.__class__.__name__ == "RateLimitError"
+        or getattr(e, "http_status", None) == 429
+        or getattr(e, "status_code", None) == 429
+    )
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(e, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Budget:
+    """Requests and tokens sent to one model within the last minute."""
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.limit = limit
+        # (time, tokens)
+        self.sent: deque[tuple[float, int]] = deque()
+        self.tokens = 0
+
+    def _expire(self, now: float) -> None:
+        while self.sent and self.sent[0][0] <= now - WINDOW:
+            self.tokens -= self.sent.popleft()[1]
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        """Seconds until a request with this many tokens fits (0 if now)."""
+        self._expire(now)
+        if not self.sent:
+            # a request above the tpm budget still gets sent alone
+            return 0.0
+        waits = [0.0]
+        if self.limit.rpm is not None and len(self.sent) >= self.limit.rpm:
+            waits.append(self.sent[len(self.sent) - self.limit.rpm][0] + WINDOW - now)
+        if self.limit.tpm is not None and self.tokens + tokens > self.limit.tpm:
+            excess = self.tokens + tokens - self.limit.tpm
+            for sent_at, sent_tokens in self.sent:
+                excess -= sent_tokens
+                if excess <= 0:
+                    waits.append(sent_at + WINDOW - now)
+                    break
+        return max(waits)
+
+    def record(self, tokens: int, now: float) -> None:
+        self.sent.append((now, tokens))
+        self.tokens += tokens
+
+
+class LLMScheduler:
+    """
+    Admits LLM requests in priority order as soon as the requests/min
+    and tokens/min budget of their model allows it.
+    A rate limit response pauses all requests (exponential backoff)
+    and the request gets queued again.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, RateLimit] = {},
+        default_limit: RateLimit = RateLimit(),
+        completion_tokens: int = 256,
+        max_retries: int = 6,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        """
+        Args:
+            limits: Rate limits per model name
+            default_limit: Rate limit of the models not in limits
+            completion_tokens: Expected completion tokens added to the prompt tokens
+            max_retries: How often a rate limited request gets queued again
+            min_backoff: Seconds to pause after the first rate limit response
+            max_backoff: Upper bound of the doubling pause
+        """
+        self.limits = limits
+        self.default_limit = default_limit
+        self.completion_tokens = completion_tokens
+        self.max_retries = max_retries
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.rate_limited = 0
+        self._budgets: dict[str, _Budget] = {}
+        # (priority, order, model, tokens, future)
+        self._queue: list[tuple[int, int, str, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._backoff = 0.0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def limit(self, model: str) -> RateLimit:
+        return self.limits.get(model, self.default_limit)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        model: str,
+        tokens: int = 0,
+        priority: int = INTERACTIVE,
+    ) -> T:
+        """Wait for the turn of the request, then send it."""
+        tokens += self.completion_tokens
+        for attempt in range(self.max_retries + 1):
+            await self._admit(model, tokens, priority)
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self._pause(_retry_after(e))
+                continue
+            self._backoff = 0.0
+            return result
+        raise AssertionError("unreachable")
+
+    async def _admit(self, model: str, tokens: int, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((priority, next(self._order), model, tokens, future))
+        self._dispatch()
+        # cancelled requests get dropped by the next dispatch
+        await future
+
+    def _pause(self, retry_after: Optional[float]) -> None:
+        self.rate_limited += 1
+        now = time.monotonic()
+        if now < self._paused_until:
+            # sent before the pause started
+            return
+        self._backoff = min(
+            max(self._backoff * 2, self.min_backoff), self.max_backoff
+        )
+        self._paused_until = max(
+            self._paused_until, now + (retry_after or self._backoff)
+        )
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        if now < self._paused_until:
+            self._schedule(self._paused_until - now)
+            return
+        blocked: set[str] = set()
+        next_check: Optional[float] = None
+        for item in sorted(self._queue):
+            _, _, model, tokens, future = item
+            if model in blocked:
+                continue
+            if future.done():
+                self._queue.remove(item)
+                continue
+            budget = self._budgets.get(model)
+            if budget is None:
+                budget = self._budgets[model] = _Budget(self.limit(model))
+            wait = budget.wait_time(tokens, now)
+            if wait > 0:
+                # later requests for this model wait behind this one
+                blocked.add(model)
+                next_check = wait if next_check is None else min(next_check, wait)
+                continue
+            budget.record(tokens, now)
+            self._queue.remove(item)
+            future.set_result(None)
+        if next_check is not None:
+            self._schedule(next_check)
+
+    def _schedule(self, delay: float) -> None:
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+_current_llm_scheduler: ContextVar[Optional[LLMScheduler]] = ContextVar(
+    "codeinterpreter_llm_scheduler", default=None
+)
+
+
+@contextmanager
+def use_llm_scheduler(scheduler: Optional[LLMScheduler]) -> Iterator[None]:
+    """Send the LLM calls run in this context through `scheduler`."""
+    token = _current_llm_scheduler.set(scheduler)
+    try:
+        yield
+    finally:
+        _current_llm_scheduler.reset(token)
+
+
+def without_client_retries(llm: Any) -> Any:
+    """
+    Copy of the llm that sends every request once, so rate limited
+    requests get retried by the scheduler instead of each client.
+    """
+    if getattr(llm, "max_retries", 1) <= 1:
+        return llm
+    # copy() drops the fields excluded from serialization (e.g. callbacks)
+    return llm.copy(update={**llm.__dict__, "max_retries": 1})
+
+
+async def call_llm(
+    llm: Any,
+    call: Callable[[], Awaitable[T]],
+    prompt: str = "",
+    priority: int = INTERACTIVE,
+) -> T:
+    """
+    Run an LLM call with the scheduler and the limiter
+    of the current context (directly without them).
+    """
+    scheduler = _current_llm_scheduler.get()
+
+    async def limited() -> T:
+        async with llm_slot():
+            return await call()
+
+    if scheduler is None:
+        return await limited()
+    model = model_name(llm)
+    tokens = count_tokens(llm, prompt) if scheduler.limit(model).tpm else 0
+    return await scheduler.run(limited, model, tokens, priority)
@@ -1,42 +1,408 @@
 import asyncio
-from pydantic import BaseModel
+import base64
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Union
+from urllib.parse import urlparse
+
+from pydantic import BaseModel, PrivateAttr
+
+from gpt_code_interpreter.config import settings
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class DiskContent:
+    """
+    File content that lives on disk and only gets read when accessed.
+    Temporary (spooled) files are removed together with the last reference,
+    so copies of a File can share them.
+    """
+
+    def __init__(self, path: str, temporary: bool = False) -> None:
+        self.path = path
+        if temporary:
+            weakref.finalize(self, _remove, path)
+
+    # copies share the file, so it lives as long as any of them
+    def __copy__(self) -> "DiskContent":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "DiskContent":
+        return self
+
+    @classmethod
+    def spool(cls, content: Union[bytes, memoryview]) -> "DiskContent":
+        with tempfile.NamedTemporaryFile(
+            prefix="codeinterpreter-", delete=False
+        ) as f:
+            f.write(content)
+        return cls(f.name, temporary=True)
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            # the mapping stays valid after closing the file
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapping)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapping.close()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpooledContentWriter:
+    """
+    Collects streamed chunks in memory until FILE_SPOOL_THRESHOLD
+    and on disk after that, hashing them on the fly.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file: Optional[tempfile._TemporaryFileWrapper] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            self.discard()
+            raise ValueError(
+                f"File is larger than max_size ({self.max_size} bytes)."
+            )
+        self.sha256.update(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        self._buffer += chunk
+        if len(self._buffer) > settings.FILE_SPOOL_THRESHOLD:
+            self._file = tempfile.NamedTemporaryFile(
+                prefix="codeinterpreter-", delete=False
+            )
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def close(self) -> Union[bytes, DiskContent]:
+        if self._file is None:
+            return bytes(self._buffer)
+        self._file.close()
+        return DiskContent(self._file.name, temporary=True)
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            _remove(self._file.name)
+            self._file = None
+        self._buffer = bytearray()
+
+
+# shared between all downloads on the same event loop
+_http_session: Optional[
+    tuple[asyncio.AbstractEventLoop, "aiohttp.ClientSession"]
+] = None
+
+
+async def get_http_session() -> "aiohttp.ClientSession":
+    global _http_session
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    if (
+        _http_session is None
+        or _http_session[0] is not loop
+        or _http_session[1].closed
+    ):
+        _http_session = (loop, aiohttp.ClientSession())
+    return _http_session[1]
+
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None:
+        await _http_session[1].close()
+        _http_session = None
+
+
+# sessions using the shared http session, it gets closed with the last one
+_http_users = 0
+
+
+def hold_http_session() -> None:
+    global _http_users
+    _http_users += 1
+
+
+async def release_http_session() -> None:
+    global _http_users
+    _http_users = max(_http_users - 1, 0)
+    if _http_users == 0:
+        await close_http_session()
+
+
+def _name_from_url(url: str) -> str:
+    return os.path.basename(urlparse(url).path) or url.split("/")[-1]
 
 
 class File(BaseModel):
+    """
+    A file sent to or received from the code interpreter.
+    Content above FILE_SPOOL_THRESHOLD bytes gets spooled to disk
+    and files created with from_path are only read when accessed.
+    """
+
     name: str
-    content: bytes
+    # None until base64 content gets decoded on first access
+    _source: Union[bytes, DiskContent, None] = PrivateAttr(default=b"")
+    _base64: Optional[str] = PrivateAttr(default=None)
+    _sha256: Optional[str] = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        name: str,
+        content: Optional[bytes] = None,
+        path: Optional[str] = None,
+        **data,
+    ) -> None:
+        super().__init__(name=name, **data)
+        if isinstance(content, str):
+            # parsed back from json, like the former bytes field did
+            content = content.encode()
+        if content is not None:
+            if len(content) > settings.FILE_SPOOL_THRESHOLD:
+                self._source = DiskContent.spool(content)
+            else:
+                self._source = bytes(content)
+        elif path is not None:
+            self._source = DiskContent(path)
+        else:
+            raise ValueError("File needs either content or a path.")
+
+    def _get_source(self) -> Union[bytes, DiskContent]:
+        if self._source is None:
+            content = base64.b64decode(self._base64)  # type: ignore
+            if len(content) > settings.FILE_SPOOL_THRESHOLD:
+                self._source = DiskContent.spool(content)
+            else:
+                self._source = content
+        return self._source
+
+    def dict(self, **kwargs: Any) -> dict[str, Any]:
+        """Includes the content, which is not a pydantic field."""
+        data = super().dict(**kwargs)
+        include, exclude = kwargs.get("include"), kwargs.get("exclude")
+        if (include is None or "content" in include) and (
+            exclude is None or "content" not in exclude
+        ):
+            data["content"] = self.content
+        return data
+
+    def json(self, *, encoder: Any = None, **kwargs: Any) -> str:
+        """Like BaseModel.json, with the content (see dict)."""
+        dict_kwargs = {
+            key: kwargs.pop(key)
+            for key in (
+                "include",
+                "exclude",
+                "by_alias",
+                "exclude_unset",
+                "exclude_defaults",
+                "exclude_none",
+            )
+            if key in kwargs
+        }
+        kwargs.pop("models_as_dict", None)
+        return self.__config__.json_dumps(
+            self.dict(**dict_kwargs),
+            default=encoder or self.__json_encoder__,
+            **kwargs,
+        )
+
+    @property
+    def content(self) -> bytes:
+        """The whole content, read from disk if necessary."""
+        if isinstance(source := self._get_source(), DiskContent):
+            return source.read()
+        return source
+
+    @property
+    def size(self) -> int:
+        if self._source is None:
+            data = self._base64.rstrip("=")  # type: ignore
+            return len(data) * 3 // 4
+        if isinstance(source := self._get_source(), DiskContent):
+            return source.size
+        return len(source)
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the content on disk, if it is disk-backed."""
+        if isinstance(source := self._get_source(), DiskContent):
+            return source.path
+        return None
+
+    def sha256(self) -> str:
+        """Hex digest of the content (computed once)."""
+        if self._sha256 is None:
+            with self.view() as view:
+                self._sha256 = hashlib.sha256(view).hexdigest()
+        return self._sha256
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """
+        Zero-copy access to the content.
+        Disk-backed content is memory-mapped until the with block exits.
+        """
+        if isinstance(source := self._get_source(), DiskContent):
+            with source.view() as view:
+                yield view
+        else:
+            yield memoryview(source)
+
+    @classmethod
+    async def afrom_content(cls, name: str, content: bytes) -> "File":
+        """Like File(name=name, content=content), spooling in a thread."""
+        if len(content) > settings.FILE_SPOOL_THRESHOLD:
+            return await asyncio.to_thread(cls, name=name, content=content)
+        return cls(name=name, content=content)
 
     @classmethod
     def from_path(cls, path: str):
-        with open(path, "rb") as f:
-            path = path.split("/")[-1]
-            return cls(name=path, content=f.read())
+        return cls(name=os.path.basename(path), path=path)
 
     @classmethod
     async def afrom_path(cls, path: str):
         return await asyncio.to_thread(cls.from_path, path)
 
     @classmethod
-    def from_url(cls, url: str):
-        import requests  # type: ignore
+    def from_base64(cls, name: str, data: str) -> "File":
+        """
+        Create a file from base64 encoded content (e.g. a plot from the kernel).
+        It only gets decoded when the content is accessed.
+        """
+        file = cls(name=name, content=b"")
+        file._source = None
+        file._base64 = data
+        return file
+
+    def to_base64(self) -> str:
+        if self._base64 is None:
+            with self.view() as view:
+                self._base64 = base64.b64encode(view).decode()
+        return self._base64
 
-        r = requests.get(url)
-        return cls(name=url.split("/")[-1], content=r.content)
+    @classmethod
+    def _from_writer(cls, name: str, writer: SpooledContentWriter) -> "File":
+        file = cls(name=name, content=b"")
+        file._source = writer.close()
+        file._sha256 = writer.sha256.hexdigest()
+        return file
 
     @classmethod
-    async def afrom_url(cls, url: str):
-        import aiohttp
+    def from_url(
+        cls,
+        url: str,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ):
+        import requests  # type: ignore
+
+        chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
+
+        writer = SpooledContentWriter(max_size=max_size)
+        try:
+            with requests.get(url, stream=True) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    writer.write(chunk)
+        except BaseException:
+            # no spool file left behind
+            writer.discard()
+            raise
+        return cls._from_writer(_name_from_url(url), writer)
 
-        async with aiohttp.ClientSession() as session:
+    @classmethod
+    async def afrom_url(
+        cls,
+        url: str,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        session: Optional["aiohttp.ClientSession"] = None,
+    ):
+        """
+        Stream the download into memory or a spool file.
+        Raises ValueError if the file is larger than max_size.
+        """
+        chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
+        session = session or await get_http_session()
+        writer = SpooledContentWriter(max_size=max_size)
+        try:
             async with session.get(url) as r:
-                return cls(name=url.split("/")[-1], content=await r.read())
+                r.raise_for_status()
+                if max_size is not None and (r.content_length or 0) > max_size:
+                    raise ValueError(
+                        f"File is larger than max_size ({max_size} bytes)."
+                    )
+                async for chunk in r.content.iter_chunked(chunk_size):
+                    if writer.spilled:
+                        await asyncio.to_thread(writer.write, chunk)
+                    else:
+                        writer.write(chunk)
+        except BaseException:
+            # no spool file left behind (e.g. network errors or cancellation)
+            writer.discard()
+            raise
+        return cls._from_writer(_name_from_url(url), writer)
 
     def save(self, path: str):
-        with open(path, "wb") as f:
-            f.write(self.content)
+        if isinstance(source := self._get_source(), DiskContent):
+            shutil.copyfile(source.path, path)
+            return
+        with open(path, "wb") as f, self.view() as view:
+            f.write(view)
 
-    async def asave(self, path: str):
-        await asyncio.to_thread(self.save, path)
+    async def asave(self, path: str, chunk_size: Optional[int] = None):
+        chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
+        if isinstance(source := self._get_source(), DiskContent):
+            await asyncio.to_thread(shutil.copyfile, source.path, path)
+            return
+        view = memoryview(source)
+        f = await asyncio.to_thread(open, path, "wb")
+        try:
+            for offset in range(0, len(view), chunk_size):
+                await asyncio.to_thread(f.write, view[offset : offset + chunk_size])
+        finally:
+            await asyncio.to_thread(f.close)
 
     def get_image(self):
         try:
@@ -49,7 +415,7 @@ class File(BaseModel):
 
         from io import BytesIO
 
-        img_io = BytesIO(self.content)
+        img_io = self.path or BytesIO(self.content)
         img = Image.open(img_io)
 
         # Convert image to RGB if it's not
@@ -1,29 +1,61 @@
 import asyncio
-import base64
 import re
 import traceback
 import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass
-from io import BytesIO
 from os import getenv
-from typing import Callable, Literal, Optional
+from typing import AsyncIterator, Callable, Iterator, Literal, Optional
 
-from codeboxapi import CodeBox  # type: ignore
+from codeboxapi.box.localbox import LocalBox  # type: ignore
 from codeboxapi.schema import CodeBoxOutput  # type: ignore
 from gpt_code_interpreter.agents import OpenAIFunctionsAgent
+from gpt_code_interpreter.cache import LLMCache
 from gpt_code_interpreter.chains import get_file_modifications, remove_download_link
+from gpt_code_interpreter.codebox import CodeBoxPool, create_codebox, warm_up
+from gpt_code_interpreter.codebox.errors import (
+    RecoverableError,
+    classify_exception,
+    classify_output,
+)
+from gpt_code_interpreter.codebox.warmup import warmup_code
 from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.installer import (
+    InstallError,
+    InstallManager,
+    activate_code,
+    default_installer,
+    is_local,
+)
+from gpt_code_interpreter.limits import BandwidthLimit, ConcurrencyLimit, use_llm_limiter
 from gpt_code_interpreter.prompts import code_interpreter_system_message
+from gpt_code_interpreter.scheduler import (
+    LLMScheduler,
+    use_llm_scheduler,
+    without_client_retries,
+)
 from gpt_code_interpreter.schema import (
     CodeInput,
     CodeInterpreterResponse,
     File,
     UserRequest,
 )
+from gpt_code_interpreter.schema.file import (
+    hold_http_session,
+    release_http_session,
+)
+from gpt_code_interpreter.store import SessionState, SessionStore
+from gpt_code_interpreter.tracing import Tracer, span, use_tracer
 from gpt_code_interpreter.utils import (
     CodeAgentOutputParser,
     CodeCallbackHandler,
     CodeChatAgentOutputParser,
+    DirectorySnapshot,
+    create_memory,
+    detect_file_writes,
+    imported_modules,
+    strip_download_links,
+    take_snapshot,
 )
 from langchain.agents import (
     AgentExecutor,
@@ -33,8 +65,8 @@ from langchain.agents import (
 )
 from langchain.chat_models import ChatAnthropic, ChatOpenAI
 from langchain.chat_models.base import BaseChatModel
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts.chat import MessagesPlaceholder
+from langchain.schema import BaseMemory, messages_from_dict, messages_to_dict
 from langchain.schema.language_model import BaseLanguageModel
 from langchain.tools import BaseTool, StructuredTool
 
@@ -42,7 +74,7 @@ from langchain.tools import BaseTool, StructuredTool
 @dataclass
 class Output:
     content: str | File
-    type: Literal["code", "code_exec_str", "str", "image", "file", "error"]
+    type: Literal["token", "code", "code_exec_str", "str", "image", "file", "error"]
 
 
 OnOutput = Callable[[Output], None]
@@ -55,21 +87,87 @@ class CodeInterpreterSession:
         additional_tools: list[BaseTool] = [],
         **kwargs,
     ) -> None:
-        self.codebox = CodeBox()
+        self.session_id: str = kwargs.get("session_id") or str(uuid.uuid4())
+        self.store: Optional[SessionStore] = kwargs.get("store", None)
+        self.tracer: Optional[Tracer] = kwargs.get("tracer", None)
+        self.pool: Optional[CodeBoxPool] = kwargs.get("pool", None)
+        # shared between the sessions of a SessionManager
+        self.llm_limiter: Optional[ConcurrencyLimit] = kwargs.get("llm_limiter", None)
+        self.upload_limiter: Optional[BandwidthLimit] = kwargs.get(
+            "upload_limiter", None
+        )
+        self.llm_scheduler: Optional[LLMScheduler] = kwargs.get("llm_scheduler", None)
+        # with a pool the codebox gets checked out in astart()
+        self.codebox_backend = kwargs.get("codebox_backend", settings.CODEBOX_BACKEND)
+        self.codebox = (
+            create_codebox(self.codebox_backend) if self.pool is None else None
+        )
+        # a pooled codebox gets warmed up by the pool
+        self.warmup_code: Optional[str] = (
+            warmup_code() if kwargs.get("warmup", settings.WARMUP) else None
+        )
+        self.installer: InstallManager = kwargs.get("installer") or default_installer()
+        self.max_run_retries = kwargs.get("max_run_retries", settings.MAX_RUN_RETRIES)
+        # runs fixed by the session and LLM steps saved by that
+        self.run_retries = 0
+        self.llm_steps_saved = 0
         self.verbose = kwargs.get("verbose", settings.VERBOSE)
+        self.file_detection = kwargs.get("file_detection", settings.FILE_DETECTION)
+        self.snapshot_hash_content = kwargs.get(
+            "snapshot_hash_content", settings.SNAPSHOT_HASH_CONTENT
+        )
+        self.scratchpad_max_tokens = kwargs.get(
+            "scratchpad_max_tokens", settings.SCRATCHPAD_MAX_TOKENS
+        )
+        self.llm_link_removal = kwargs.get(
+            "llm_link_removal", settings.LLM_LINK_REMOVAL
+        )
+        self.llm_cache: Optional[LLMCache] = kwargs.get("llm_cache", None)
+        self.cache_agent_plans = kwargs.get(
+            "cache_agent_plans", settings.CACHE_AGENT_PLANS
+        )
         self.tools: list[BaseTool] = self._tools(additional_tools)
         self.llm: BaseLanguageModel = llm or self._choose_llm(**kwargs)
+        if self.llm_scheduler is not None:
+            # the scheduler retries rate limited requests itself, also
+            # for a user supplied (or SessionManager) llm
+            self.llm = without_client_retries(self.llm)
+        self.memory: BaseMemory = kwargs.get("memory") or create_memory(
+            kwargs.get("memory_policy", settings.MEMORY_POLICY),
+            llm=self.llm,
+            window=kwargs.get("memory_window", settings.MEMORY_WINDOW),
+            max_tokens=kwargs.get("memory_max_tokens", settings.MEMORY_MAX_TOKENS),
+        )
+        self.callback_handler = CodeCallbackHandler(self)
         self.agent_executor: AgentExecutor = self._agent_executor()
         self.input_files: list[File] = []
         self.output_files: list[File] = []
         self.on_output: OnOutput = lambda x: None
+        self._last_snapshot: Optional[DirectorySnapshot] = None
+        # remote filename -> sha256 of the uploaded content
+        self._uploaded: dict[str, str] = {}
+        self._upload_semaphore = asyncio.Semaphore(
+            kwargs.get("max_concurrent_uploads", settings.MAX_CONCURRENT_UPLOADS)
+        )
+        # a kernel connection runs one piece of code at a time
+        self._copy_lock = asyncio.Lock()
+        self._holds_http_session = False
         self.done = asyncio.Event()
 
     def start(self) -> None:
+        if self.pool is not None:
+            raise NotImplementedError("Use astart() when using a CodeBoxPool.")
         self.codebox.start()
 
     async def astart(self) -> None:
-        if type(self.codebox) != CodeBox:
+        self._uploaded.clear()
+        if not self._holds_http_session:
+            hold_http_session()
+            self._holds_http_session = True
+        if self.pool is not None:
+            self.codebox = await self.pool.acquire()
+            return
+        if isinstance(self.codebox, LocalBox):
             # check if jupyter-kernel-gateway is installed
             import pkg_resources  # type: ignore
 
@@ -82,8 +180,16 @@ class CodeInterpreterSession:
                 )
                 exit(1)
         await self.codebox.astart()
+        with use_tracer(self.tracer):
+            await warm_up(self.codebox, self.warmup_code)
 
     def _tools(self, additional_tools: list[BaseTool]) -> list[BaseTool]:
+        state = (
+            "Variables are NOT preserved between runs, so every run has to "
+            "import and load everything it needs again. "
+            if self.codebox_backend == "process"
+            else "Variables are preserved between runs. "
+        )
         return additional_tools + [
             StructuredTool(
                 name="python",
@@ -93,7 +199,7 @@ class CodeInterpreterSession:
                 "Input a string of code to a python interpreter (jupyter kernel). "
                 "Write the entire code in a single string. This string can "
                 "be really long, so you can use the `;` character to split lines. "
-                "Variables are preserved between runs. ",
+                + state,
                 func=self._run_handler,
                 coroutine=self._arun_handler,
                 args_schema=CodeInput,
@@ -134,6 +240,8 @@ class CodeInterpreterSession:
                 extra_prompt_messages=[
                     MessagesPlaceholder(variable_name="chat_history")
                 ],
+                scratchpad_max_tokens=self.scratchpad_max_tokens,
+                llm_cache=self.llm_cache if self.cache_agent_plans else None,
             )
             if isinstance(self.llm, ChatOpenAI)
             else ConversationalChatAgent.from_llm_and_tools(
@@ -154,13 +262,10 @@ class CodeInterpreterSession:
     def _agent_executor(self) -> AgentExecutor:
         return AgentExecutor.from_agent_and_tools(
             agent=self._choose_agent(),
-            callbacks=[CodeCallbackHandler(self)],
             max_iterations=9,
             tools=self.tools,
             verbose=self.verbose,
-            memory=ConversationBufferMemory(
-                memory_key="chat_history", return_messages=True
-            ),
+            memory=self.memory,
         )
 
     async def show_code(self, code: str) -> None:
@@ -173,21 +278,26 @@ class CodeInterpreterSession:
 
     async def _arun_handler(self, code: str):
         """Run code in container and send the output to the user"""
-        print("Running code in container...", code)
+        if self.verbose:
+            print("Running code in container...", code)
 
         self.on_output(Output(content=code, type="code"))
 
-        output: CodeBoxOutput = await self.codebox.arun(code)
+        before = self._last_snapshot or await self._snapshot()
+        self._last_snapshot = None
+        output = await self._run(code)
 
         if not isinstance(output.content, str):
             raise TypeError("Expected output.content to be a string.")
 
+        if output.type != "text":
+            # the writes of the run are not checked, so any uploaded file
+            # might have been changed in the sandbox
+            self._uploaded.clear()
+
         if output.type == "image/png":
             filename = f"image-{uuid.uuid4()}.png"
-            file_buffer = BytesIO(base64.b64decode(output.content))
-            file_buffer.name = filename
-
-            file = File(name=filename, content=file_buffer.read())
+            file = File.from_base64(filename, output.content)
 
             self.on_output(Output(content=file, type="image"))
             self.output_files.append(file)
@@ -195,32 +305,31 @@ class CodeInterpreterSession:
             return f"Image {filename} got send to the user."
 
         elif output.type == "error":
-            if "ModuleNotFoundError" in output.content:
-                if package := re.search(
-                    r"ModuleNotFoundError: No module named '(.*)'", output.content
-                ):
-                    await self.codebox.ainstall(package.group(1))
-                    return f"{package.group(1)} was missing but got installed now. Please try again."
-            else:
-                # TODO: preanalyze error to optimize next code generation
-                pass
-
-            self.on_output(Output(conatent=output.content, type="error"))
+            # TODO: preanalyze error to optimize next code generation
+            self.on_output(Output(content=output.content, type="error"))
 
             if self.verbose:
                 print("Error:", output.content)
 
-        elif modifications := await get_file_modifications(code, self.llm):
+        elif modifications := await self._file_modifications(code, before):
             for filename in modifications:
+                # the sandbox copy no longer matches what we uploaded
+                self._uploaded.pop(filename, None)
                 if filename in [file.name for file in self.input_files]:
                     continue
-                fileb = await self.codebox.adownload(filename)
+                try:
+                    with span("codebox.download") as s:
+                        fileb = await self.codebox.adownload(filename)
+                        s.attributes["bytes"] = len(fileb.content or b"")
+                except Exception as e:
+                    # e.g. a file name the detection guessed wrong
+                    if self.verbose:
+                        print(f"Error while downloading {filename}:", e)
+                    continue
                 if not fileb.content:
                     continue
-                file_buffer = BytesIO(fileb.content)
-                file_buffer.name = filename
 
-                file = File(name=filename, content=file_buffer.read())
+                file = await File.afrom_content(filename, fileb.content)
                 self.output_files.append(file)
 
                 self.on_output(Output(content=file, type="file"))
@@ -230,9 +339,131 @@ class CodeInterpreterSession:
 
         return output.content
 
+    async def _run(self, code: str) -> CodeBoxOutput:
+        """
+        Run the code. Failures the session can fix itself (missing module,
+        file missing in the sandbox, failed connection) get fixed and the
+        code runs again, up to max_run_retries times, which saves the LLM
+        step of retrying it. A dead kernel gets restarted, but the code
+        (its likely cause) is not run again.
+        """
+        with span("codebox.run", code_bytes=len(code)) as s:
+            retries = 0
+            while True:
+                try:
+                    output: CodeBoxOutput = await self.codebox.arun(code)
+                except Exception as e:
+                    error = classify_exception(e)
+                    if error is None or (
+                        error.kind == "transient" and retries >= self.max_run_retries
+                    ):
+                        raise
+                    output = CodeBoxOutput(
+                        type="error", content=f"{e.__class__.__name__}: {e}"
+                    )
+                else:
+                    error = classify_output(
+                        output, [file.name for file in self.input_files]
+                    )
+                if error is None:
+                    break
+                if error.kind == "kernel_died":
+                    await self._recover(error, code)
+                    output = CodeBoxOutput(
+                        type="error",
+                        content=f"{output.content}\nThe kernel got restarted, "
+                        "so the variables of the previous runs are lost.",
+                    )
+                    break
+                if retries >= self.max_run_retries:
+                    break
+                retries += 1
+                s.attributes[f"retries_{error.kind}"] = (
+                    s.attributes.get(f"retries_{error.kind}", 0) + 1
+                )
+                if self.verbose:
+                    print(f"Recovering from {error.kind} and running again...")
+                try:
+                    await self._recover(error, code)
+                except InstallError as e:
+                    output = CodeBoxOutput(
+                        type="error",
+                        content=f"{output.content}\nInstalling it failed: {e}",
+                    )
+                    break
+            saved = int(retries > 0 and error is None)
+            s.attributes.update(
+                output_bytes=len(output.content), retries=retries, llm_steps_saved=saved
+            )
+        self.run_retries += retries
+        self.llm_steps_saved += saved
+        return output
+
+    async def _recover(self, error: RecoverableError, code: str) -> None:
+        if error.kind == "missing_module":
+            await self.installer.ainstall(
+                self.codebox, error.name, imported_modules(code)  # type: ignore
+            )
+            if not getattr(self.codebox, "stateless", False):
+                # local packages go into the target instead of the python of
+                # the kernel, which caches the directory listings of sys.path
+                await self.codebox.arun(
+                    activate_code(self.installer.target)
+                    if is_local(self.codebox)
+                    else "import importlib; importlib.invalidate_caches()"
+                )
+        elif error.kind == "kernel_died":
+            await self.codebox.arestart()
+            await self._restore_files()
+            await warm_up(self.codebox, self.warmup_code)
+        elif error.kind == "file_not_uploaded":
+            self._uploaded.pop(error.name, None)  # type: ignore
+            for file in self.input_files:
+                if file.name == error.name:
+                    await self._upload(file)
+        elif error.kind == "transient":
+            await asyncio.sleep(0.5)
+
+    async def _snapshot(self) -> Optional[DirectorySnapshot]:
+        if self.file_detection != "snapshot":
+            return None
+        with span("session.snapshot"):
+            return await take_snapshot(
+                self.codebox, hash_content=self.snapshot_hash_content
+            )
+
+    async def _file_modifications(
+        self, code: str, before: Optional[DirectorySnapshot]
+    ) -> Optional[list[str]]:
+        """Determine the files created or modified by the code."""
+        with span("session.file_modifications") as s:
+            if before is not None and (after := await self._snapshot()) is not None:
+                # the next run can start from here
+                self._last_snapshot = after
+                for filename in [f for f in self._uploaded if f not in after.files]:
+                    del self._uploaded[filename]
+                s.attributes["method"] = "snapshot"
+                return before.diff(after)
+            filenames = None
+            if self.file_detection in ("snapshot", "static"):
+                if (filenames := detect_file_writes(code)) is not None:
+                    s.attributes["method"] = "static"
+            if filenames is None:
+                s.attributes["method"] = "llm"
+                filenames = await get_file_modifications(
+                    code, self.llm, cache=self.llm_cache
+                )
+            if filenames:
+                # only a snapshot accounts for every write, so code that
+                # writes files might have changed uploaded files as well
+                self._uploaded.clear()
+            return filenames
+
     async def _input_handler(self, request: UserRequest):
         if not request.files:
             return
+        # uploads change the directory, so the next run takes a fresh snapshot
+        self._last_snapshot = None
         if not request.content:
             request.content = (
                 "I uploaded, just text me back and confirm that you got the file(s)."
@@ -241,19 +472,64 @@ class CodeInterpreterSession:
         for file in request.files:
             self.input_files.append(file)
             request.content += f"[Attachment: {file.name}]\n"
-            await self.codebox.aupload(file.name, file.content)
+        await asyncio.gather(*(self._upload(file) for file in request.files))
         request.content += "**File(s) are now available in the cwd. **\n"
 
+    async def _upload(self, file: File) -> None:
+        """Upload a file unless the sandbox already has the same content."""
+        with span("session.upload", bytes=file.size) as s:
+            sha256 = await asyncio.to_thread(file.sha256)
+            if self._uploaded.get(file.name) == sha256:
+                s.attributes.update(bytes=0, skipped=1)
+                return
+            async with self._upload_semaphore:
+                source = next(
+                    (name for name, h in self._uploaded.items() if h == sha256), None
+                )
+                if source is not None and await self._copy_in_sandbox(
+                    source, file.name
+                ):
+                    s.attributes.update(bytes=0, copied=1)
+                else:
+                    if self.upload_limiter is not None:
+                        await self.upload_limiter.acquire(file.size)
+                    with file.view() as view:
+                        await self.codebox.aupload(file.name, view)
+            self._uploaded[file.name] = sha256
+
+    async def _copy_in_sandbox(self, source: str, target: str) -> bool:
+        """Copy an uploaded file in the sandbox (False if it failed)."""
+        try:
+            async with self._copy_lock:
+                output = await self.codebox.arun(
+                    f"__import__('shutil').copyfile({source!r}, {target!r})"
+                )
+        except Exception as e:
+            if self.verbose:
+                print(f"Error while copying {source} to {target}:", e)
+            return False
+        return output.type != "error"
+
     async def _output_handler(self, final_response: str) -> CodeInterpreterResponse:
-        """Embed images in the response"""
-        for file in self.output_files:
-            if str(file.name) in final_response:
-                # rm ![Any](file.name) from the response
-                final_response = re.sub(rf"\n\n!\[.*\]\(.*\)", "", final_response)
+        """Remove embedded output files and download links from the response"""
+        with span("session.output"):
+            return await self._process_output(final_response)
+
+    async def _process_output(self, final_response: str) -> CodeInterpreterResponse:
+        if self.output_files:
+            final_response = strip_download_links(
+                final_response, {file.name: file for file in self.output_files}
+            )
 
-        if self.output_files and re.search(rf"\n\[.*\]\(.*\)", final_response):
+        if (
+            self.llm_link_removal
+            and self.output_files
+            and re.search(rf"\[.*\]\(.*\)", final_response)
+        ):
             try:
-                final_response = await remove_download_link(final_response, self.llm)
+                final_response = await remove_download_link(
+                    final_response, self.llm, cache=self.llm_cache
+                )
             except Exception as e:
                 if self.verbose:
                     print("Error while removing download links:", e)
@@ -270,14 +546,39 @@ class CodeInterpreterSession:
         """Generate a Code Interpreter response based on the user's input."""
         self.on_output = on_output
 
+        with use_tracer(self.tracer), use_llm_limiter(self.llm_limiter):
+            with use_llm_scheduler(self.llm_scheduler), span(
+                "session.turn", session_id=self.session_id
+            ):
+                return await self._generate_response(user_msg, files, detailed_error)
+
+    async def _generate_response(
+        self, user_msg: str, files: list[File], detailed_error: bool
+    ) -> CodeInterpreterResponse:
         user_request = UserRequest(content=user_msg, files=files)
         try:
             self.done.clear()
             await self._input_handler(user_request)
-            response = await self.agent_executor.arun(input=user_request.content)
+            response = await self.agent_executor.arun(
+                input=user_request.content,
+                # passed per run so they get inherited by the llm calls
+                callbacks=[self.callback_handler],
+            )
+            if hasattr(self.memory, "aprune"):
+                try:
+                    await self.memory.aprune()  # type: ignore
+                except Exception as e:
+                    if self.verbose:
+                        print("Error while summarizing the memory:", e)
             output = await self._output_handler(response)
             self.on_output(Output(content=output, type="str"))
-            return await self._output_handler(response)
+            if self.store is not None:
+                try:
+                    await self.asave()
+                except Exception as e:
+                    if self.verbose:
+                        print("Error while saving the session:", e)
+            return output
         except Exception as e:
             if self.verbose:
                 traceback.print_exc()
@@ -293,12 +594,147 @@ class CodeInterpreterSession:
         finally:
             self.done.set()
 
+    async def astream_response(
+        self,
+        user_msg: str,
+        files: list[File] = [],
+        detailed_error: bool = False,
+    ) -> AsyncIterator[Output]:
+        """
+        Generate a response and stream its events while the agent works:
+        LLM tokens, code being run, execution output, images, files and
+        finally the whole CodeInterpreterResponse as "str" event.
+        """
+        queue: asyncio.Queue[Output] = asyncio.Queue()
+        with self._streaming_agent():
+            task = asyncio.create_task(
+                self.generate_response(
+                    user_msg, files, detailed_error, on_output=queue.put_nowait
+                )
+            )
+            answered = False
+            try:
+                while not task.done() or not queue.empty():
+                    get = asyncio.ensure_future(queue.get())
+                    await asyncio.wait(
+                        {get, task}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not get.done():
+                        get.cancel()
+                        continue
+                    output = get.result()
+                    answered = answered or output.type == "str"
+                    yield output
+                if not answered:
+                    # errors are returned as response without a "str" event
+                    yield Output(content=task.result(), type="str")  # type: ignore
+            finally:
+                if not task.done():
+                    task.cancel()
+
+    @contextmanager
+    def _streaming_agent(self) -> Iterator[None]:
+        """
+        Let the agent use a streaming copy of the llm, since tokens only
+        reach the callback handler when streaming. The llm itself might be
+        shared with other sessions (e.g. of a SessionManager).
+        """
+        agent = self.agent_executor.agent
+        holder = agent if hasattr(agent, "llm") else getattr(agent, "llm_chain", None)
+        llm = getattr(holder, "llm", None)
+        if llm is None or getattr(llm, "streaming", None) is not False:
+            yield
+            return
+        # copy() drops the fields excluded from serialization (e.g. callbacks)
+        holder.llm = llm.copy(update={**llm.__dict__, "streaming": True})
+        try:
+            yield
+        finally:
+            holder.llm = llm  # type: ignore
+
+    async def asave(self) -> None:
+        """Persist the chat memory and the files of the session to the store."""
+        if self.store is None:
+            raise ValueError("No session store configured.")
+        with span("session.save"):
+            await self._save_state(self.store)
+
+    async def _save_state(self, store: SessionStore) -> None:
+        chat_memory = getattr(self.memory, "chat_memory", None)
+        input_files = await asyncio.gather(
+            *(store.aput_file(file) for file in self.input_files)
+        )
+        output_files = await asyncio.gather(
+            *(store.aput_file(file) for file in self.output_files)
+        )
+        state = SessionState(
+            session_id=self.session_id,
+            messages=messages_to_dict(chat_memory.messages) if chat_memory else [],
+            summary=getattr(self.memory, "moving_summary_buffer", None),
+            input_files=input_files,
+            output_files=output_files,
+        )
+        await store.asave_state(state)
+
+    @classmethod
+    async def aresume(
+        cls, session_id: str, store: SessionStore, **kwargs
+    ) -> "CodeInterpreterSession":
+        """
+        Rehydrate a session from the store and start it.
+        Only the files the new CodeBox is missing get uploaded again.
+        """
+        state = await store.aload_state(session_id)
+        if state is None:
+            raise ValueError(f"Session {session_id} not found in the store.")
+        session = cls(session_id=session_id, store=store, **kwargs)
+        if (chat_memory := getattr(session.memory, "chat_memory", None)) is not None:
+            chat_memory.messages = messages_from_dict(state.messages)
+        if state.summary is not None and hasattr(
+            session.memory, "moving_summary_buffer"
+        ):
+            session.memory.moving_summary_buffer = state.summary  # type: ignore
+        session.input_files = list(
+            await asyncio.gather(*(store.aget_file(ref) for ref in state.input_files))
+        )
+        session.output_files = list(
+            await asyncio.gather(*(store.aget_file(ref) for ref in state.output_files))
+        )
+        await session.astart()
+        await session._restore_files()
+        return session
+
+    async def _restore_files(self) -> None:
+        """Upload the session files the CodeBox is missing."""
+        # later versions of a file overwrite earlier ones
+        files = {file.name: file for file in self.input_files + self.output_files}
+        snapshot = await take_snapshot(self.codebox, hash_content=True)
+        self._last_snapshot = None
+        for name, file in files.items():
+            stat = snapshot.files.get(name) if snapshot is not None else None
+            if stat is None:
+                continue
+            sha256 = await asyncio.to_thread(file.sha256)
+            if stat.sha256 == sha256:
+                self._uploaded[name] = sha256
+        await asyncio.gather(*(self._upload(file) for file in files.values()))
+
     async def is_running(self) -> bool:
         return await self.codebox.astatus() == "running"
 
     async def astop(self) -> None:
         self.queue = None
-        await self.codebox.astop()
+        if self.pool is not None:
+            # only a CodeBox checked out by astart() goes back, and only once
+            codebox, self.codebox = self.codebox, None
+            if codebox is not None:
+                await self.pool.release(codebox)
+        else:
+            await self.codebox.astop()
+        if self._holds_http_session:
+            # downloads of File.afrom_url share it, the last session closes it
+            self._holds_http_session = False
+            await release_http_session()
 
     async def __aenter__(self) -> "CodeInterpreterSession":
         await self.astart()
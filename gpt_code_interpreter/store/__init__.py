@@ -0,0 +1,3 @@
+from .base import FileRef, SessionState, SessionStore
+from .local import LocalSessionStore
+from .sqlite import SQLiteSessionStore
@@ -0,0 +1,80 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from pydantic import BaseModel
+
+from gpt_code_interpreter.schema import File
+
+
+class FileRef(BaseModel):
+    name: str
+    sha256: str
+
+
+class SessionState(BaseModel):
+    """Everything needed to resume a CodeInterpreterSession."""
+
+    session_id: str
+    # langchain messages_to_dict format
+    messages: list[dict] = []
+    # moving summary of a summary memory
+    summary: Optional[str] = None
+    input_files: list[FileRef] = []
+    output_files: list[FileRef] = []
+
+
+class SessionStore(ABC):
+    """
+    Persists session states and the content of their files.
+    File contents are stored content-addressed, so identical
+    files of different sessions or turns are stored once.
+    """
+
+    @abstractmethod
+    def save_state(self, state: SessionState) -> None:
+        ...
+
+    @abstractmethod
+    def load_state(self, session_id: str) -> Optional[SessionState]:
+        ...
+
+    @abstractmethod
+    def delete_state(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def has_blob(self, sha256: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put_blob(self, sha256: str, file: File) -> None:
+        ...
+
+    @abstractmethod
+    def get_blob(self, sha256: str, name: str) -> File:
+        ...
+
+    def put_file(self, file: File) -> FileRef:
+        sha256 = file.sha256()
+        if not self.has_blob(sha256):
+            self.put_blob(sha256, file)
+        return FileRef(name=file.name, sha256=sha256)
+
+    def get_file(self, ref: FileRef) -> File:
+        return self.get_blob(ref.sha256, ref.name)
+
+    async def asave_state(self, state: SessionState) -> None:
+        await asyncio.to_thread(self.save_state, state)
+
+    async def aload_state(self, session_id: str) -> Optional[SessionState]:
+        return await asyncio.to_thread(self.load_state, session_id)
+
+    async def adelete_state(self, session_id: str) -> None:
+        await asyncio.to_thread(self.delete_state, session_id)
+
+    async def aput_file(self, file: File) -> FileRef:
+        return await asyncio.to_thread(self.put_file, file)
+
+    async def aget_file(self, ref: FileRef) -> File:
+        return await asyncio.to_thread(self.get_file, ref)
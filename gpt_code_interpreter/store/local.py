@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from gpt_code_interpreter.schema import File
+from gpt_code_interpreter.store.base import SessionState, SessionStore
+
+
+class LocalSessionStore(SessionStore):
+    """
+    Stores session states as json files and file contents as blobs
+    in a local (or shared network) directory:
+
+        <root>/sessions/<session_id>.json
+        <root>/blobs/<sha256[:2]>/<sha256>
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(os.path.join(root, "sessions"), exist_ok=True)
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+
+    def _state_path(self, session_id: str) -> str:
+        if os.path.basename(session_id) != session_id:
+            raise ValueError(f"Invalid session id: {session_id}")
+        return os.path.join(self.root, "sessions", f"{session_id}.json")
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _write_atomic(self, path: str, write) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def save_state(self, state: SessionState) -> None:
+        data = state.json().encode()
+        self._write_atomic(
+            self._state_path(state.session_id), lambda f: f.write(data)
+        )
+
+    def load_state(self, session_id: str) -> Optional[SessionState]:
+        path = self._state_path(session_id)
+        if not os.path.exists(path):
+            return None
+        return SessionState.parse_file(path)
+
+    def delete_state(self, session_id: str) -> None:
+        try:
+            os.remove(self._state_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def has_blob(self, sha256: str) -> bool:
+        return os.path.exists(self._blob_path(sha256))
+
+    def put_blob(self, sha256: str, file: File) -> None:
+        def write(f) -> None:
+            if file.path is None:
+                with file.view() as view:
+                    f.write(view)
+                return
+            with open(file.path, "rb") as source:
+                shutil.copyfileobj(source, f)
+
+        self._write_atomic(self._blob_path(sha256), write)
+
+    def get_blob(self, sha256: str, name: str) -> File:
+        path = self._blob_path(sha256)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No blob stored for {name} ({sha256})")
+        return File(name=name, path=path)
@@ -0,0 +1,75 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from gpt_code_interpreter.schema import File
+from gpt_code_interpreter.store.base import SessionState, SessionStore
+
+
+class SQLiteSessionStore(SessionStore):
+    """Stores session states and file contents in a single SQLite database."""
+
+    def __init__(self, path: str = "codeinterpreter_sessions.db") -> None:
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, content BLOB NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # one connection per call, so the store can be used from worker threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_state(self, state: SessionState) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated_at) "
+                "VALUES (?, ?, ?)",
+                (state.session_id, state.json(), time.time()),
+            )
+
+    def load_state(self, session_id: str) -> Optional[SessionState]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return SessionState.parse_raw(row[0]) if row else None
+
+    def delete_state(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def has_blob(self, sha256: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        return row is not None
+
+    def put_blob(self, sha256: str, file: File) -> None:
+        with self._connect() as conn, file.view() as view:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, content) VALUES (?, ?)",
+                (sha256, view),
+            )
+
+    def get_blob(self, sha256: str, name: str) -> File:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No blob stored for {name} ({sha256})")
+        return File(name=name, content=row[0])
@@ -0,0 +1,181 @@
+"""
+Lightweight tracing of where a turn spends its time.
+
+Spans are emitted by the session, the agent and the chains
+to the tracer of the current context (see `use_tracer`),
+so nothing gets recorded unless a session has a tracer:
+
+    collector = InMemoryCollector()
+    session = CodeInterpreterSession(tracer=Tracer([collector]))
+    ...
+    print(PrometheusExporter(collector).render())
+"""
+
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional, Protocol, Sequence
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    end: Optional[float] = None
+    # e.g. prompt_tokens, completion_tokens, bytes, session_id
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class SpanCollector(Protocol):
+    def collect(self, span: Span) -> None:
+        ...
+
+
+class Tracer:
+    def __init__(self, collectors: Sequence[SpanCollector] = ()) -> None:
+        self.collectors = list(collectors)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        span = Span(name=name, start=time.perf_counter(), attributes=attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = e.__class__.__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            for collector in self.collectors:
+                collector.collect(span)
+
+
+_current_tracer: ContextVar[Optional[Tracer]] = ContextVar(
+    "codeinterpreter_tracer", default=None
+)
+
+
+@contextmanager
+def use_tracer(tracer: Optional[Tracer]) -> Iterator[None]:
+    """Send the spans of everything run in this context to `tracer`."""
+    token = _current_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _current_tracer.reset(token)
+
+
+def is_tracing() -> bool:
+    return _current_tracer.get() is not None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Record a span with the current tracer (no-op without one)."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield Span(name=name, start=0.0, attributes=attributes)
+        return
+    with tracer.span(name, **attributes) as s:
+        yield s
+
+
+def count_tokens(llm: Any, text: str) -> int:
+    try:
+        return llm.get_num_tokens(text)
+    except Exception:
+        # e.g. tiktoken is not installed
+        return len(text) // 4
+
+
+class InMemoryCollector:
+    """Keeps the most recent spans and running totals per span name."""
+
+    def __init__(self, max_spans: int = 10_000) -> None:
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+        self.counts: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.durations: dict[str, float] = defaultdict(float)
+        # span name -> attribute -> sum of the numeric values
+        self.totals: dict[str, dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    def collect(self, span: Span) -> None:
+        self.spans.append(span)
+        self.counts[span.name] += 1
+        self.durations[span.name] += span.duration
+        if span.error is not None:
+            self.errors[span.name] += 1
+        for key, value in span.attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.totals[span.name][key] += value
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """Duration percentile (0-100) of the retained spans with this name."""
+        durations = sorted(s.duration for s in self.spans if s.name == name)
+        if not durations:
+            return None
+        return durations[min(int(len(durations) * q / 100), len(durations) - 1)]
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {
+                "count": count,
+                "errors": self.errors[name],
+                "total_seconds": self.durations[name],
+                "mean_seconds": self.durations[name] / count,
+                **self.totals[name],
+            }
+            for name, count in self.counts.items()
+        }
+
+    def clear(self) -> None:
+        self.spans.clear()
+        self.counts.clear()
+        self.errors.clear()
+        self.durations.clear()
+        self.totals.clear()
+
+
+class PrometheusExporter:
+    """Renders the totals of an InMemoryCollector in the Prometheus text format."""
+
+    def __init__(
+        self, collector: InMemoryCollector, prefix: str = "codeinterpreter"
+    ) -> None:
+        self.collector = collector
+        self.prefix = prefix
+
+    def render(self) -> str:
+        p = self.prefix
+        c = self.collector
+        lines = [
+            f"# TYPE {p}_span_duration_seconds summary",
+            *(
+                f'{p}_span_duration_seconds_sum{{span="{name}"}} {c.durations[name]}'
+                for name in c.counts
+            ),
+            *(
+                f'{p}_span_duration_seconds_count{{span="{name}"}} {count}'
+                for name, count in c.counts.items()
+            ),
+            f"# TYPE {p}_span_errors_total counter",
+            *(
+                f'{p}_span_errors_total{{span="{name}"}} {c.errors[name]}'
+                for name in c.counts
+            ),
+            f"# TYPE {p}_span_attribute_total counter",
+            *(
+                f'{p}_span_attribute_total{{span="{name}",attribute="{key}"}} {value}'
+                for name, totals in c.totals.items()
+                for key, value in totals.items()
+            ),
+        ]
+        return "\n".join(lines) + "\n"
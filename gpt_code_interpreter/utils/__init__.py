@@ -1,2 +1,6 @@
 from .callbacks import CodeCallbackHandler
 from .parser import CodeAgentOutputParser, CodeChatAgentOutputParser
+from .snapshot import DirectorySnapshot, take_snapshot
+from .code_analysis import detect_file_writes, imported_modules
+from .markdown import strip_download_links
+from .memory import MemoryPolicy, create_memory
@@ -12,6 +12,13 @@ class CodeCallbackHandler(AsyncIteratorCallbackHandler):
         self.session = session
         super().__init__()
 
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        """Forward streamed tokens to the current on_output of the session."""
+        from gpt_code_interpreter.session import Output
+
+        if token:
+            self.session.on_output(Output(content=token, type="token"))
+
     async def on_agent_action(
         self,
         action: AgentAction,
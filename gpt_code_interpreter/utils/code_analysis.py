@@ -0,0 +1,304 @@
+import ast
+import posixpath
+import re
+from typing import Optional
+
+# method name -> index and keyword names of the path argument
+WRITE_METHODS: dict[str, tuple] = {
+    "savefig": (0, "fname"),
+    "to_csv": (0, "path_or_buf"),
+    "to_excel": (0, "excel_writer"),
+    "to_parquet": (0, "path"),
+    "to_json": (0, "path_or_buf"),
+    "to_pickle": (0, "path"),
+    "to_feather": (0, "path"),
+    "to_html": (0, "buf"),
+    "write_image": (0, "file"),
+    "write_html": (0, "file"),
+    # PIL, openpyxl and numpy
+    "save": (0, "fp", "filename", "file"),
+    "savez": (0, "file"),
+    "savez_compressed": (0, "file"),
+    "savetxt": (0, "fname"),
+}
+# return the content as string instead of writing it when called without a path
+STRING_METHODS = ("to_csv", "to_json", "to_html")
+# numpy adds these suffixes if the file name does not end with them
+NUMPY_SUFFIXES = {"save": ".npy", "savez": ".npz", "savez_compressed": ".npz"}
+# only recognized when called as shutil.<name>(...)
+SHUTIL_FUNCTIONS: dict[str, tuple[int, str]] = {
+    "copy": (1, "dst"),
+    "copy2": (1, "dst"),
+    "copyfile": (1, "dst"),
+    "move": (1, "dst"),
+}
+# only recognized when called as os.<name>(...)
+OS_FUNCTIONS: dict[str, tuple[int, str]] = {
+    "rename": (1, "dst"),
+    "replace": (1, "dst"),
+}
+OS_REMOVE_FUNCTIONS = ("remove", "unlink")
+# calls known not to write to a file name passed to them,
+# any other call with a file name argument makes the result ambiguous
+READ_FUNCTIONS = (
+    "open",
+    "print",
+    "Path",
+    "read_csv",
+    "read_excel",
+    "read_json",
+    "read_parquet",
+    "read_table",
+    "read_pickle",
+    "read_feather",
+    "read_html",
+    "read_sql",
+    "load",
+    "loadtxt",
+    "genfromtxt",
+    "imread",
+    "exists",
+    "isfile",
+    "isdir",
+    "join",
+    "basename",
+    "dirname",
+    "splitext",
+    "getsize",
+    "listdir",
+    "remove",
+    "unlink",
+)
+FILENAME = re.compile(r"^[^\s'\"]*\.[A-Za-z0-9]{1,5}$")
+SUFFIX = re.compile(r"\.[A-Za-z0-9]{1,5}$")
+# writes files we can not see from the source code
+SHELL_FUNCTIONS = (
+    "system",
+    "popen",
+    "run",
+    "call",
+    "check_call",
+    "check_output",
+    "Popen",
+)
+ARCHIVE_SUFFIXES = {"gztar": ".tar.gz", "bztar": ".tar.bz2", "xztar": ".tar.xz"}
+WRITE_MODES = ("w", "a", "x", "+")
+
+
+class Ambiguous(Exception):
+    pass
+
+
+class _WriteCollector(ast.NodeVisitor):
+    def __init__(self) -> None:
+        self.constants: dict[str, str] = {}
+        self.filenames: list[str] = []
+        # function name -> files written in its body
+        self.functions: dict[str, list[str]] = {}
+        self.called: set[str] = set()
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self.generic_visit(node)
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            try:
+                self.constants[target.id] = self._resolve(node.value)
+            except Ambiguous:
+                self.constants.pop(target.id, None)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        # the writes of a function only count if it gets called
+        filenames, self.filenames = self.filenames, []
+        self.generic_visit(node)
+        self.functions.setdefault(node.name, []).extend(self.filenames)
+        self.filenames = filenames
+
+    visit_AsyncFunctionDef = visit_FunctionDef  # type: ignore
+
+    def visit_Call(self, node: ast.Call) -> None:
+        self.generic_visit(node)
+        func = node.func
+        if isinstance(func, ast.Name):
+            self.called.add(func.id)
+            if func.id == "open":
+                self._visit_open(node)
+            elif func.id not in READ_FUNCTIONS:
+                self._check_unknown(node)
+            return
+        if not isinstance(func, ast.Attribute):
+            return
+        self.called.add(func.attr)
+        if isinstance(func.value, ast.Name) and func.value.id in (
+            "os",
+            "subprocess",
+        ):
+            if func.attr in SHELL_FUNCTIONS:
+                raise Ambiguous
+            if func.value.id == "os" and func.attr in OS_FUNCTIONS:
+                self._add(self._argument(node, *OS_FUNCTIONS[func.attr]))
+            elif func.value.id == "os" and func.attr in OS_REMOVE_FUNCTIONS:
+                self._remove(self._argument(node, 0, "path"))
+        elif isinstance(func.value, ast.Name) and func.value.id == "shutil":
+            if func.attr in SHUTIL_FUNCTIONS:
+                self._add(self._argument(node, *SHUTIL_FUNCTIONS[func.attr]))
+            elif func.attr == "make_archive":
+                self._visit_make_archive(node)
+        elif func.attr == "ZipFile":
+            self._visit_open(node)
+        elif func.attr in ("write_text", "write_bytes"):
+            # Path("file.txt").write_text(...)
+            if not isinstance(func.value, ast.Call) or not func.value.args:
+                raise Ambiguous
+            self._add(func.value.args[0])
+        elif func.attr in WRITE_METHODS:
+            path = self._argument(node, *WRITE_METHODS[func.attr])
+            if func.attr in STRING_METHODS and (
+                path is None or (isinstance(path, ast.Constant) and path.value is None)
+            ):
+                # e.g. df.to_csv() returns a string instead of writing
+                return
+            if (
+                isinstance(func.value, ast.Name)
+                and func.value.id in ("np", "numpy")
+                and func.attr in NUMPY_SUFFIXES
+            ):
+                self._add_numpy(path, NUMPY_SUFFIXES[func.attr])
+            else:
+                self._add(path)
+        elif func.attr not in READ_FUNCTIONS:
+            self._check_unknown(node)
+
+    def _check_unknown(self, node: ast.Call) -> None:
+        """An unknown call with a file name argument might write to it."""
+        for arg in [*node.args, *(kw.value for kw in node.keywords)]:
+            if self._is_filename(arg):
+                raise Ambiguous
+
+    def _is_filename(self, node: ast.expr) -> bool:
+        try:
+            return FILENAME.match(self._resolve(node)) is not None
+        except Ambiguous:
+            pass
+        # e.g. f"{name}.png" or name + ".png"
+        if isinstance(node, ast.JoinedStr) and node.values:
+            tail = node.values[-1]
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            tail = node.right
+        else:
+            return False
+        return (
+            isinstance(tail, ast.Constant)
+            and isinstance(tail.value, str)
+            and SUFFIX.search(tail.value) is not None
+        )
+
+    def _remove(self, path: Optional[ast.expr]) -> None:
+        if path is None:
+            raise Ambiguous
+        filename = posixpath.normpath(self._resolve(path))
+        self.filenames = [f for f in self.filenames if f != filename]
+
+    def _visit_open(self, node: ast.Call) -> None:
+        mode = self._argument(node, 1, "mode")
+        if mode is not None and any(m in self._resolve(mode) for m in WRITE_MODES):
+            self._add(self._argument(node, 0, "file"))
+
+    def _visit_make_archive(self, node: ast.Call) -> None:
+        base_name = self._argument(node, 0, "base_name")
+        fmt = self._argument(node, 1, "format")
+        if base_name is None or fmt is None:
+            raise Ambiguous
+        suffix = self._resolve(fmt)
+        self._add_filename(
+            self._resolve(base_name) + ARCHIVE_SUFFIXES.get(suffix, f".{suffix}")
+        )
+
+    def _add(self, path: Optional[ast.expr]) -> None:
+        if path is None:
+            raise Ambiguous
+        self._add_filename(self._resolve(path))
+
+    def _add_numpy(self, path: Optional[ast.expr], suffix: str) -> None:
+        if path is None:
+            raise Ambiguous
+        filename = self._resolve(path)
+        self._add_filename(filename if filename.endswith(suffix) else filename + suffix)
+
+    def _add_filename(self, filename: str) -> None:
+        self.filenames.append(posixpath.normpath(filename))
+
+    @staticmethod
+    def _argument(node: ast.Call, index: int, *keywords: str) -> Optional[ast.expr]:
+        if len(node.args) > index:
+            return node.args[index]
+        for kw in node.keywords:
+            if kw.arg in keywords:
+                return kw.value
+        return None
+
+    def _resolve(self, node: ast.expr) -> str:
+        """Evaluate literal strings, simple f-strings and known constants."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in self.constants:
+            return self.constants[node.id]
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.FormattedValue):
+                    if value.format_spec is not None or value.conversion != -1:
+                        raise Ambiguous
+                    parts.append(self._resolve(value.value))
+                else:
+                    parts.append(self._resolve(value))
+            return "".join(parts)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            return self._resolve(node.left) + self._resolve(node.right)
+        raise Ambiguous
+
+
+def detect_file_writes(code: str) -> Optional[list[str]]:
+    """
+    Statically find the files the code writes to.
+    Returns None if the result is ambiguous
+    (e.g. dynamic paths or code that is not valid python).
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    collector = _WriteCollector()
+    try:
+        collector.visit(tree)
+    except Ambiguous:
+        return None
+    filenames = collector.filenames + [
+        filename
+        for name, written in collector.functions.items()
+        if name in collector.called
+        for filename in written
+    ]
+    # only files in the working directory can be downloaded
+    return list(
+        dict.fromkeys(
+            filename
+            for filename in filenames
+            if not filename.startswith("/") and filename.split("/")[0] != ".."
+        )
+    )
+
+
+def imported_modules(code: str) -> list[str]:
+    """Top-level names of the modules the code imports (absolute imports only)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    modules: list[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules += [alias.name.split(".")[0] for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.append(node.module.split(".")[0])
+    return list(dict.fromkeys(modules))
@@ -0,0 +1,89 @@
+import posixpath
+import re
+from collections.abc import Mapping, Set
+from typing import Collection
+
+# [label](target) and ![alt](target "title")
+LINK_PATTERN = re.compile(
+    r"(!?)\[([^\]]*)\]\(\s*<?([^)\s>]*)>?(?:\s+\"[^\"]*\")?\s*\)"
+)
+PLACEHOLDER_PATTERN = re.compile(r"\x00(\d+)\x00")
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]*(?:[.!?]+|$)[ \t]*", re.MULTILINE)
+CLAUSE_BREAK_PATTERN = re.compile(r"[,;:]\s+|\s+(?:and|or|where)\s+|\s+[-–—]\s+")
+DOWNLOAD_PATTERN = re.compile(r"\b(download\w*|here|link|click|access)\b", re.I)
+# ```python ... ``` (up to the end of the text if it is not closed)
+FENCE_PATTERN = re.compile(
+    r"^[ \t]*(`{3,}|~{3,}).*?(?:^[ \t]*\1[ \t]*$|\Z)", re.M | re.S
+)
+# list items that lost their only content, e.g. "2. [Download](sandbox:/a.csv)"
+EMPTY_ITEM_PATTERN = re.compile(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]*(?:\n|\Z)", re.M)
+
+
+def _is_output_link(target: str, filenames: Collection[str]) -> bool:
+    if target.startswith("sandbox:"):
+        return True
+    path = target.split("?")[0].lstrip("./")
+    return path in filenames or posixpath.basename(path) in filenames
+
+
+def _rewrite_sentence(sentence: str, labels: list[str]) -> str:
+    def restore(text: str) -> str:
+        return PLACEHOLDER_PATTERN.sub(lambda m: labels[int(m.group(1))], text)
+
+    if not DOWNLOAD_PATTERN.search(restore(sentence)):
+        # e.g. "The plot [sin_wave.png](sandbox:/sin_wave.png) shows ..."
+        return restore(sentence)
+    # drop the dangling "you can download it [here](...)" clause
+    before_link = sentence[: PLACEHOLDER_PATTERN.search(sentence).start()]  # type: ignore
+    breaks = list(CLAUSE_BREAK_PATTERN.finditer(before_link))
+    if not breaks or DOWNLOAD_PATTERN.search(before_link[: breaks[-1].start()]):
+        return ""
+    punctuation, whitespace = re.search(r"([.!?]*)([ \t]*)$", sentence).groups()  # type: ignore
+    kept = restore(before_link[: breaks[-1].start()]).rstrip()
+    return kept + (punctuation or ".") + whitespace
+
+
+def strip_download_links(text: str, filenames: Collection[str]) -> str:
+    """
+    Remove sandbox download links and image embeds of output files
+    (the files get sent to the user separately) and reformat
+    the sentences around them. Fenced code blocks are left untouched.
+    All links get tokenized in a single pass and looked up in `filenames`,
+    so pass a set or a name -> File mapping for large sessions.
+    """
+    if not isinstance(filenames, (Mapping, Set)):
+        filenames = set(filenames)
+    parts: list[str] = []
+    position = 0
+    for fence in FENCE_PATTERN.finditer(text):
+        parts.append(_strip_prose(text[position : fence.start()], filenames))
+        parts.append(fence.group())
+        position = fence.end()
+    parts.append(_strip_prose(text[position:], filenames))
+    return "".join(parts).strip()
+
+
+def _strip_prose(text: str, filenames: Collection[str]) -> str:
+    labels: list[str] = []
+
+    def replace_link(match: re.Match) -> str:
+        is_image, label, target = match.groups()
+        if not _is_output_link(target, filenames):
+            return match.group()
+        if is_image:
+            return ""
+        labels.append(label)
+        return f"\x00{len(labels) - 1}\x00"
+
+    text = LINK_PATTERN.sub(replace_link, text)
+    if labels:
+        text = SENTENCE_PATTERN.sub(
+            lambda m: _rewrite_sentence(m.group(), labels)
+            if PLACEHOLDER_PATTERN.search(m.group())
+            else m.group(),
+            text,
+        )
+    text = re.sub(r"[ \t]+$", "", text, flags=re.MULTILINE)
+    if labels:
+        text = EMPTY_ITEM_PATTERN.sub("", text)
+    return re.sub(r"\n{3,}", "\n\n", text)
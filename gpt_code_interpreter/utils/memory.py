@@ -0,0 +1,119 @@
+from typing import Any, Literal, Optional
+
+from langchain.chains import LLMChain
+from langchain.memory import (
+    ConversationBufferMemory,
+    ConversationBufferWindowMemory,
+    ConversationSummaryBufferMemory,
+    ConversationTokenBufferMemory,
+)
+from langchain.schema import BaseMemory, BaseMessage, get_buffer_string
+from langchain.schema.language_model import BaseLanguageModel
+
+from gpt_code_interpreter.scheduler import AUXILIARY, call_llm
+from gpt_code_interpreter.tracing import count_tokens, span
+
+MemoryPolicy = Literal["buffer", "window", "token", "summary"]
+
+
+def count_message_tokens(llm: BaseLanguageModel, messages: list[BaseMessage]) -> int:
+    try:
+        return llm.get_num_tokens_from_messages(messages)
+    except Exception:
+        # e.g. tiktoken is not installed
+        return count_tokens(llm, get_buffer_string(messages))
+
+
+class TokenBufferMemory(ConversationTokenBufferMemory):
+    """Counts the tokens without a tokenizer if the llm has none installed."""
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        super(ConversationTokenBufferMemory, self).save_context(inputs, outputs)
+        buffer = self.chat_memory.messages
+        while buffer and count_message_tokens(self.llm, buffer) > self.max_token_limit:
+            buffer.pop(0)
+
+
+class SummaryBufferMemory(ConversationSummaryBufferMemory):
+    """
+    Summarizes in `aprune()` after the turn instead of in `save_context`,
+    which langchain calls synchronously, so the summary does not block
+    the event loop and goes through the scheduler of the session.
+    """
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        super(ConversationSummaryBufferMemory, self).save_context(inputs, outputs)
+
+    def prune(self) -> None:
+        raise NotImplementedError("Use aprune() with the SummaryBufferMemory.")
+
+    async def aprune(self) -> None:
+        """Summarize the oldest messages until the rest fits max_token_limit."""
+        buffer = self.chat_memory.messages
+        # the messages get dropped once their summary is there
+        count = 0
+        while (
+            count < len(buffer)
+            and count_message_tokens(self.llm, buffer[count:]) > self.max_token_limit
+        ):
+            count += 1
+        if not count:
+            return
+        pruned = buffer[:count]
+        new_lines = get_buffer_string(
+            pruned, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix
+        )
+        chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        with span("memory.summarize", messages=len(pruned)):
+            self.moving_summary_buffer = await call_llm(
+                self.llm,
+                lambda: chain.apredict(
+                    summary=self.moving_summary_buffer, new_lines=new_lines
+                ),
+                prompt=self.moving_summary_buffer + new_lines,
+                priority=AUXILIARY,
+            )
+        del buffer[:count]
+
+
+def create_memory(
+    policy: MemoryPolicy,
+    llm: BaseLanguageModel,
+    window: int = 10,
+    max_tokens: int = 2000,
+    memory_key: str = "chat_history",
+) -> BaseMemory:
+    """
+    Create the conversation memory of a session.
+
+    Policies:
+        buffer: keep the whole conversation (grows without limit)
+        window: keep the last `window` turns
+        token: keep the most recent messages within `max_tokens`,
+            counted with the tokenizer of the llm (estimated without one)
+        summary: like token, but older messages get summarized
+            by the llm instead of dropped (after the turn, see `aprune`)
+    """
+    if policy == "buffer":
+        return ConversationBufferMemory(memory_key=memory_key, return_messages=True)
+    if policy == "window":
+        return ConversationBufferWindowMemory(
+            memory_key=memory_key, return_messages=True, k=window
+        )
+    if policy == "token":
+        return TokenBufferMemory(
+            memory_key=memory_key,
+            return_messages=True,
+            llm=llm,
+            max_token_limit=max_tokens,
+        )
+    if policy == "summary":
+        return SummaryBufferMemory(
+            memory_key=memory_key,
+            return_messages=True,
+            llm=llm,
+            max_token_limit=max_tokens,
+        )
+    raise ValueError(
+        f"Unknown memory policy: {policy} (expected buffer, window, token or summary)"
+    )
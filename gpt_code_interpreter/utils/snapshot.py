@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from codeboxapi import CodeBox  # type: ignore
+from codeboxapi.schema import CodeBoxOutput  # type: ignore
+
+# Runs inside the kernel, so it cleans up after itself
+# to not leave any variables behind for the agent.
+# The result is published as display data because
+# stdout of a run gets truncated by the LocalBox.
+SNAPSHOT_CODE = """
+def __ci_snapshot(hash_content, max_hash_size, max_entries):
+    import hashlib, json, os
+    from IPython.display import display
+    def publish(result):
+        display({{"text/plain": json.dumps(result)}}, raw=True)
+    entries = {{}}
+    for root, dirs, files in os.walk("."):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), ".")
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest = None
+            if hash_content and stat.st_size <= max_hash_size:
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            entries[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            if len(entries) >= max_entries:
+                return publish({{"truncated": True}})
+    publish({{"files": entries}})
+__ci_snapshot({hash_content}, {max_hash_size}, {max_entries})
+del __ci_snapshot
+"""
+
+
+def scan_directory(
+    root: str, hash_content: bool, max_hash_size: int, max_entries: int
+) -> dict:
+    """Same as SNAPSHOT_CODE, for working directories on this host."""
+    entries = {}
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest = None
+            if hash_content and stat.st_size <= max_hash_size:
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            entries[os.path.relpath(path, root)] = [
+                stat.st_size,
+                stat.st_mtime_ns,
+                digest,
+            ]
+            if len(entries) >= max_entries:
+                return {"truncated": True}
+    return {"files": entries}
+
+
+@dataclass(frozen=True)
+class FileStat:
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DirectorySnapshot:
+    """State of the sandbox working directory at one point in time."""
+
+    files: dict[str, FileStat]
+
+    def diff(self, after: "DirectorySnapshot") -> list[str]:
+        """Filenames created or modified between this snapshot and `after`."""
+        return [
+            name
+            for name, stat in after.files.items()
+            if self.files.get(name) != stat
+        ]
+
+
+async def take_snapshot(
+    codebox: CodeBox,
+    hash_content: bool = False,
+    max_hash_size: int = 64 * 1024 * 1024,
+    max_entries: int = 10_000,
+) -> Optional[DirectorySnapshot]:
+    """
+    List names, sizes, mtimes and optionally content hashes
+    of the files in the sandbox working directory.
+    Returns None if the CodeBox backend does not allow it.
+    """
+    workdir = getattr(codebox, "workdir", None)
+    if workdir is not None:
+        # local backends: no need for a round trip through the kernel
+        result = await asyncio.to_thread(
+            scan_directory, workdir, hash_content, max_hash_size, max_entries
+        )
+        if "files" not in result:
+            return None
+        return DirectorySnapshot(
+            files={name: FileStat(*stat) for name, stat in result["files"].items()}
+        )
+    code = SNAPSHOT_CODE.format(
+        hash_content=hash_content,
+        max_hash_size=max_hash_size,
+        max_entries=max_entries,
+    )
+    try:
+        output: CodeBoxOutput = await codebox.arun(code)
+        result = json.loads(output.content)
+    except Exception:
+        return None
+    if output.type != "text" or not isinstance(result, dict) or "files" not in result:
+        return None
+    return DirectorySnapshot(
+        files={name: FileStat(*stat) for name, stat in result["files"].items()}
+    )
@@ -0,0 +1,152 @@
+"""
+Offline stand-ins for the LLM and the CodeBox,
+so the tests and benchmarks run without network access.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+from types import ModuleType
+from typing import Any, Callable, Iterator, Optional
+
+from codeboxapi.schema import CodeBoxFile, CodeBoxOutput, CodeBoxStatus  # type: ignore
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(ChatOpenAI):
+    """
+    Replays a script of agent steps: a dict is returned as call of the
+    python function, a str as final answer. The script starts over after
+    each final answer. Calls without functions (the auxiliary chains)
+    get a canned answer.
+    """
+
+    script: list[Any] = []
+    latency: float = 0.0
+    calls: int = 0
+    # calls of the auxiliary chains
+    auxiliary_calls: int = 0
+    position: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if "functions" not in kwargs:
+            self.auxiliary_calls += 1
+            content = messages[-1].content
+            if "Determine modifications" in content:
+                message = AIMessage(content='{"modifications": []}')
+            else:
+                message = AIMessage(content=content)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        step = self.script[self.position % len(self.script)]
+        self.position = 0 if isinstance(step, str) else self.position + 1
+        if isinstance(step, dict):
+            message = AIMessage(
+                content="",
+                additional_kwargs={
+                    "function_call": {"name": "python", "arguments": json.dumps(step)}
+                },
+            )
+        else:
+            message = AIMessage(content=step)
+            if run_manager and self.streaming:
+                for token in step.split(" "):
+                    await run_manager.on_llm_new_token(token + " ")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@contextmanager
+def _ipython_display(display: Callable[..., None]) -> Iterator[None]:
+    """Let `from IPython.display import display` import the given function."""
+    ipython, module = ModuleType("IPython"), ModuleType("IPython.display")
+    module.display = display  # type: ignore
+    ipython.display = module  # type: ignore
+    saved = {name: sys.modules.get(name) for name in ("IPython", "IPython.display")}
+    sys.modules.update({"IPython": ipython, "IPython.display": module})
+    try:
+        yield
+    finally:
+        for name, saved_module in saved.items():
+            if saved_module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = saved_module
+
+
+class FakeCodeBox:
+    """
+    In-process CodeBox that runs the code with exec in a temporary directory.
+    Raw display data (e.g. of the session's snapshot script) is returned
+    as text, like the LocalBox does.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.cwd: Optional[str] = None
+        self.namespace: dict[str, Any] = {}
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+    async def astart(self) -> CodeBoxStatus:
+        await asyncio.sleep(self.latency)
+        self.cwd = tempfile.mkdtemp(prefix="fake-codebox-")
+        return CodeBoxStatus(status="started")
+
+    async def astatus(self) -> CodeBoxStatus:
+        return CodeBoxStatus(status="running" if self.cwd else "stopped")
+
+    async def astop(self) -> CodeBoxStatus:
+        if self.cwd is not None:
+            shutil.rmtree(self.cwd, ignore_errors=True)
+            self.cwd = None
+        return CodeBoxStatus(status="stopped")
+
+    async def arun(self, code: str) -> CodeBoxOutput:
+        await asyncio.sleep(self.latency)
+        stdout = StringIO()
+        displayed: list[str] = []
+
+        def display(*objs: Any, raw: bool = False, **kwargs: Any) -> None:
+            for obj in objs:
+                displayed.append(obj["text/plain"] if raw else repr(obj))
+
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.cwd)  # type: ignore
+            with redirect_stdout(stdout), _ipython_display(display):
+                exec(code, self.namespace)
+        except Exception as e:
+            content = f"{e.__class__.__name__}: {e}"
+            return CodeBoxOutput(type="error", content=content)
+        finally:
+            os.chdir(cwd)
+        return CodeBoxOutput(
+            type="text",
+            content=stdout.getvalue() + "".join(displayed)
+            or "code run successfully (no output)",
+        )
+
+    async def aupload(self, file_name: str, content: bytes) -> CodeBoxStatus:
+        await asyncio.sleep(self.latency)
+        self.bytes_uploaded += len(content)
+        with open(os.path.join(self.cwd, file_name), "wb") as f:  # type: ignore
+            f.write(content)
+        return CodeBoxStatus(status=f"{file_name} uploaded successfully")
+
+    async def adownload(self, file_name: str) -> CodeBoxFile:
+        await asyncio.sleep(self.latency)
+        with open(os.path.join(self.cwd, file_name), "rb") as f:  # type: ignore
+            content = f.read()
+        self.bytes_downloaded += len(content)
+        return CodeBoxFile(name=file_name, content=content)
+
+    async def ainstall(self, package_name: str) -> CodeBoxStatus:
+        return CodeBoxStatus(status=f"{package_name} installed successfully")
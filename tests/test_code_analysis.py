@@ -0,0 +1,59 @@
+import pytest
+
+from gpt_code_interpreter.utils.code_analysis import detect_file_writes
+
+
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        ("df.to_csv('out.csv', index=False)", ["out.csv"]),
+        ("plt.savefig('plot.png')", ["plot.png"]),
+        ("with open('a.txt', 'w') as f:\n    f.write('x')", ["a.txt"]),
+        ("from pathlib import Path\nPath('b.txt').write_text('x')", ["b.txt"]),
+        ("name = 'c.csv'\ndf.to_csv(name)", ["c.csv"]),
+        ("wb.save(filename='x.xlsx')", ["x.xlsx"]),
+        ("np.save('arr', a)", ["arr.npy"]),
+        ("np.save('arr.npy', a)", ["arr.npy"]),
+        ("numpy.savez_compressed('arrays', a=a)", ["arrays.npz"]),
+        ("print(open('a.txt').read())", []),
+        ("df = pd.read_csv('data.csv')\nprint(df.head())", []),
+        # these return a string when called without a path
+        ("csv = df.to_csv(index=False)", []),
+        ("print(df.to_json(None))", []),
+    ],
+)
+def test_detect_file_writes(code, expected):
+    assert detect_file_writes(code) == expected
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        # function of the code that never gets called
+        "def save(df):\n    df.to_csv('out.csv')",
+        "df.to_csv('/tmp/out.csv')",
+        "df.to_csv('../out.csv')",
+        "df.to_csv('out.csv')\nimport os\nos.remove('out.csv')",
+    ],
+)
+def test_detect_file_writes_skips_files_that_are_not_outputs(code):
+    assert detect_file_writes(code) == []
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "df.to_csv(name)",
+        "plt.savefig(buffer)",
+        "wb.save()",
+        "df.to_excel()",
+        "cv2.imwrite('out.png', image)",
+        "p = 'out.png'\ncv2.imwrite(p, image)",
+        "cv2.imwrite(f'{name}.png', image)",
+        "cv2.imwrite(name + '.png', image)",
+        "sf.write('out.wav', data, 44100)",
+        "import os\nos.system('touch a.txt')",
+    ],
+)
+def test_detect_file_writes_is_none_for_unknown_writes(code):
+    assert detect_file_writes(code) is None
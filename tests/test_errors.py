@@ -0,0 +1,28 @@
+import aiohttp
+from codeboxapi.schema import CodeBoxOutput  # type: ignore
+
+from gpt_code_interpreter.codebox.errors import classify_exception, classify_output
+
+
+def test_classify_exception():
+    assert classify_exception(ConnectionRefusedError()).kind == "transient"  # type: ignore
+    assert (
+        classify_exception(RuntimeError("Could not connect to kernel")).kind  # type: ignore
+        == "kernel_died"
+    )
+    # the code might have run already
+    assert classify_exception(TimeoutError()) is None
+    assert classify_exception(aiohttp.ServerDisconnectedError()) is None
+    assert classify_exception(ValueError("Kernel died")) is None
+
+
+def test_classify_output():
+    error = "ModuleNotFoundError: No module named 'sklearn.linear_model'"
+    output = CodeBoxOutput(type="error", content=error)
+    assert classify_output(output).name == "sklearn"  # type: ignore
+    output = CodeBoxOutput(
+        type="error",
+        content="FileNotFoundError: [Errno 2] No such file or directory: './a.csv'",
+    )
+    assert classify_output(output, ["a.csv"]).kind == "file_not_uploaded"  # type: ignore
+    assert classify_output(CodeBoxOutput(type="text", content="Kernel died")) is None
@@ -0,0 +1,76 @@
+import asyncio
+import copy
+import gc
+import os
+
+import pytest
+
+from gpt_code_interpreter.config import settings
+from gpt_code_interpreter.schema import File
+
+
+@pytest.fixture
+def spool_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "FILE_SPOOL_THRESHOLD", 16)
+
+
+def test_small_file_stays_in_memory(spool_threshold):
+    file = File(name="a.txt", content=b"small")
+    assert file.path is None
+    assert file.content == b"small"
+
+
+def test_large_file_gets_spooled(spool_threshold):
+    content = b"x" * 100
+    file = File(name="a.txt", content=content)
+    assert file.path is not None and os.path.getsize(file.path) == 100
+    assert file.content == content
+    assert file.size == 100
+    with file.view() as view:
+        assert bytes(view) == content
+    # the mapping gets closed with the block, not by the garbage collector
+    with pytest.raises(ValueError):
+        view.tobytes()
+
+
+def test_spooled_file_lives_as_long_as_a_copy(spool_threshold):
+    file = File(name="a.txt", content=b"x" * 100)
+    path = file.path
+    duplicate = copy.deepcopy(file)
+    del file
+    gc.collect()
+    assert duplicate.content == b"x" * 100
+    del duplicate
+    gc.collect()
+    assert not os.path.exists(path)  # type: ignore
+
+
+def test_spooled_file_keeps_content_in_json(spool_threshold):
+    file = File(name="a.txt", content=b"x" * 100)
+    restored = File.parse_raw(file.json())
+    assert restored.content == file.content
+
+
+def test_async_content_gets_spooled(spool_threshold):
+    file = asyncio.run(File.afrom_content("a.txt", b"x" * 100))
+    assert file.path is not None
+    assert file.content == b"x" * 100
+    small = asyncio.run(File.afrom_content("b.txt", b"small"))
+    assert small.path is None
+
+
+def test_chunk_size_setting_is_read_at_call_time(monkeypatch, tmp_path):
+    writes = []
+    monkeypatch.setattr(settings, "FILE_CHUNK_SIZE", 4)
+    file = File(name="a.txt", content=b"x" * 10)
+    path = str(tmp_path / "a.txt")
+    real_to_thread = asyncio.to_thread
+
+    async def to_thread(func, *args):
+        if getattr(func, "__name__", "") == "write":
+            writes.append(len(args[0]))
+        return await real_to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", to_thread)
+    asyncio.run(file.asave(path))
+    assert writes == [4, 4, 2]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from gpt_code_interpreter import installer as installer_module
+from gpt_code_interpreter.installer import InstallError, InstallManager
+from gpt_code_interpreter.utils.code_analysis import imported_modules
+
+
+class LocalBox:
+    """Stands in for a CodeBox running with the python of this host."""
+
+    def __init__(self, workdir: str) -> None:
+        self.workdir = workdir
+
+
+class RecordingInstallManager(InstallManager):
+    def __init__(self, failing: tuple[str, ...] = (), **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.failing = failing
+        self.pip_calls: list[tuple[str, ...]] = []
+
+    async def _pip(self, command: str, *args: str) -> None:
+        self.pip_calls.append((command, *args))
+        if args[-1] in self.failing:
+            raise InstallError(f"No matching distribution found for {args[-1]}")
+
+
+def test_imported_modules():
+    code = "import numpy as np\nfrom sklearn.linear_model import X\nfrom . import y"
+    assert imported_modules(code) == ["numpy", "sklearn"]
+
+
+def test_local_installs_go_into_the_target(tmp_path, monkeypatch):
+    # the host only has os
+    monkeypatch.setattr(
+        installer_module, "_importable", lambda name, target=None: name == "os"
+    )
+    (tmp_path / "workdir").mkdir()
+    # a helper module of the sandbox, not a package to install
+    (tmp_path / "workdir" / "seaborn.py").write_text("")
+    installer = RecordingInstallManager(
+        failing=("scikit-image",), target=str(tmp_path / "packages")
+    )
+    installed = asyncio.run(
+        installer.ainstall(
+            LocalBox(str(tmp_path / "workdir")),
+            "cihello",
+            ["os", "cihello", "seaborn", "skimage", "unknown_module", "fitz"],
+        )
+    )
+    # only well-known extras the host is missing, a failing one is skipped
+    assert installed == ["cihello", "PyMuPDF"]
+    assert all(
+        call[:3] == ("install", "--target", str(tmp_path / "packages"))
+        for call in installer.pip_calls
+    )
+    assert not any(
+        call[-1] in ("seaborn", "unknown_module") for call in installer.pip_calls
+    )
+
+
+def test_failed_install_raises(tmp_path):
+    installer = RecordingInstallManager(failing=("cihello",), target=str(tmp_path))
+    with pytest.raises(InstallError):
+        asyncio.run(installer.ainstall(LocalBox(str(tmp_path)), "cihello"))
+    assert installer.installed(LocalBox(str(tmp_path))) == set()
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("jupyter_client")
+
+from gpt_code_interpreter.codebox.kernel import KernelBox  # noqa: E402
+
+
+def test_long_run_gets_interrupted():
+    async def run():
+        box = KernelBox(timeout=2)
+        await box.astart()
+        try:
+            await box.arun("x = 1")
+            output = await box.arun("import time\ntime.sleep(60)")
+            # the kernel keeps its state after the interrupt
+            after = await box.arun("print(x)")
+        finally:
+            await box.astop()
+        return output, after
+
+    output, after = asyncio.run(run())
+    assert output.type == "error"
+    assert output.content.startswith("TimeoutError")
+    assert after.content.strip() == "1"
+
+
+def test_kernel_ignoring_the_interrupt_gets_restarted(monkeypatch):
+    monkeypatch.setattr("gpt_code_interpreter.codebox.kernel.INTERRUPT_GRACE", 1)
+    code = (
+        "import signal, time\n"
+        "signal.signal(signal.SIGINT, signal.SIG_IGN)\n"
+        "time.sleep(60)"
+    )
+
+    async def run():
+        box = KernelBox(timeout=2)
+        await box.astart()
+        try:
+            output = await box.arun(code)
+            after = await box.arun("print(1 + 1)")
+        finally:
+            await box.astop()
+        return output, after
+
+    output, after = asyncio.run(run())
+    assert output.content.startswith("TimeoutError")
+    assert after.content.strip() == "2"
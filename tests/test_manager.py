@@ -0,0 +1,13 @@
+import pytest
+from codeboxapi.config import settings as codebox_settings  # type: ignore
+
+from gpt_code_interpreter import SessionManager
+from gpt_code_interpreter.store import SQLiteSessionStore
+
+
+def test_manager_rejects_the_local_box(monkeypatch, tmp_path):
+    monkeypatch.setattr(codebox_settings, "CODEBOX_API_KEY", None)
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    with pytest.raises(ValueError):
+        SessionManager(store, codebox_backend="codebox")
+    SessionManager(store, codebox_backend="kernel")
@@ -0,0 +1,33 @@
+from gpt_code_interpreter.utils.markdown import strip_download_links
+
+
+def test_strip_download_links_removes_download_clause():
+    text = (
+        "I saved the first rows to result.csv, "
+        "you can [download it here](sandbox:/mnt/data/result.csv)."
+    )
+    assert strip_download_links(text, {"result.csv"}) == (
+        "I saved the first rows to result.csv."
+    )
+
+
+def test_strip_download_links_keeps_label_and_other_links():
+    text = (
+        "The plot [sin_wave.png](sandbox:/sin_wave.png) shows a sine wave. "
+        "See [the docs](https://matplotlib.org)."
+    )
+    assert strip_download_links(text, {"sin_wave.png"}) == (
+        "The plot sin_wave.png shows a sine wave. "
+        "See [the docs](https://matplotlib.org)."
+    )
+
+
+def test_strip_download_links_drops_emptied_list_items():
+    text = "Files:\n1. [Download data](sandbox:/data.csv)\n2. The plot is ready."
+    assert strip_download_links(text, {"data.csv"}) == "Files:\n2. The plot is ready."
+
+
+def test_strip_download_links_leaves_fenced_code_untouched():
+    code = "```python\nx = 1   \n\n\n\nprint('[a](sandbox:/a.csv)')\n```"
+    text = f"Download [a.csv](sandbox:/a.csv).\n\n{code}"
+    assert strip_download_links(text, {"a.csv"}) == code
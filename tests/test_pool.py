@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fakes import FakeCodeBox, ScriptedChatModel
+
+from gpt_code_interpreter import CodeBoxPool, CodeInterpreterSession
+
+
+class FailingCodeBox(FakeCodeBox):
+    async def astart(self):
+        await asyncio.sleep(0.01)
+        raise ConnectionError("could not start")
+
+
+def test_waiting_acquire_wakes_up_when_a_slot_frees():
+    async def run():
+        async with CodeBoxPool(min_size=0, max_size=1, factory=FakeCodeBox) as pool:
+            codebox = await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            await pool.release(codebox)
+            await asyncio.wait_for(waiter, 1)
+            assert pool.size == 1
+
+    asyncio.run(run())
+
+
+def test_waiting_acquire_wakes_up_when_a_warm_up_fails():
+    boxes = iter([FakeCodeBox(), FailingCodeBox(), FakeCodeBox()])
+
+    async def run():
+        pool = CodeBoxPool(min_size=0, max_size=2, factory=lambda: next(boxes))
+        async with pool:
+            first = await pool.acquire()
+            pool.min_size = 1
+            # boots the failing box in the background and takes the last slot
+            pool._replenish()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.wait_for(waiter, 1)
+            assert pool.size == 2
+            await pool.release(first)
+
+    asyncio.run(run())
+
+
+def test_waiting_acquire_raises_when_the_pool_closes():
+    async def run():
+        pool = CodeBoxPool(min_size=0, max_size=1, factory=FakeCodeBox)
+        await pool.astart()
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        await pool.astop()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(run())
+
+
+def test_session_without_codebox_releases_nothing():
+    async def run():
+        async with CodeBoxPool(min_size=1, max_size=1, factory=FakeCodeBox) as pool:
+            llm = ScriptedChatModel(openai_api_key="test")  # type: ignore
+            session = CodeInterpreterSession(llm=llm, pool=pool)
+            await session.astop()
+            assert pool.size == 1
+
+    asyncio.run(run())
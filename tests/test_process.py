@@ -0,0 +1,13 @@
+import asyncio
+
+import pytest
+
+from gpt_code_interpreter.codebox.process import ProcessBox
+from gpt_code_interpreter.installer import InstallError
+
+
+def test_failed_install_raises(tmp_path):
+    box = ProcessBox(cwd=str(tmp_path / "cwd"), packages=str(tmp_path / "packages"))
+    missing = str(tmp_path / "missing-0.1-py3-none-any.whl")
+    with pytest.raises(InstallError):
+        asyncio.run(box.ainstall(missing))
@@ -0,0 +1,39 @@
+from fakes import ScriptedChatModel
+
+from gpt_code_interpreter import CodeInterpreterSession
+from gpt_code_interpreter.scheduler import WINDOW, LLMScheduler, RateLimit, _Budget
+
+
+def test_budget_waits_for_the_oldest_request_per_rpm():
+    budget = _Budget(RateLimit(rpm=2))
+    budget.record(10, now=0.0)
+    budget.record(10, now=1.0)
+    assert budget.wait_time(10, now=2.0) == WINDOW - 2.0
+    assert budget.wait_time(10, now=WINDOW) == 0.0
+
+
+def test_budget_waits_until_enough_tokens_expire():
+    budget = _Budget(RateLimit(tpm=100))
+    budget.record(60, now=0.0)
+    budget.record(30, now=10.0)
+    assert budget.wait_time(10, now=20.0) == 0.0
+    assert budget.wait_time(50, now=20.0) == WINDOW - 20.0
+    assert budget.wait_time(80, now=20.0) == WINDOW + 10.0 - 20.0
+
+
+def test_budget_sends_oversized_request_alone():
+    budget = _Budget(RateLimit(tpm=100))
+    assert budget.wait_time(1000, now=0.0) == 0.0
+
+
+def test_session_disables_the_client_retries_of_a_scheduled_llm():
+    llm = ScriptedChatModel(openai_api_key="test", max_retries=6)  # type: ignore
+    scheduler = LLMScheduler({"gpt-3.5-turbo": RateLimit(rpm=10)})
+    session = CodeInterpreterSession(
+        llm=llm, llm_scheduler=scheduler, codebox_backend="process"
+    )
+    assert session.llm.max_retries == 1  # type: ignore
+    assert session.agent_executor.agent.llm.max_retries == 1  # type: ignore
+    # the llm might be shared with other sessions
+    assert llm.max_retries == 6
+    assert session.llm.callbacks is llm.callbacks  # type: ignore
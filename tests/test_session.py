@@ -0,0 +1,116 @@
+import asyncio
+
+from fakes import FakeCodeBox, ScriptedChatModel
+
+from gpt_code_interpreter import CodeBoxPool, CodeInterpreterSession, File
+from gpt_code_interpreter.schema.file import get_http_session
+
+
+def run_turn(script: list, user_msg: str = "What is 1 + 1?", **kwargs):
+    async def turn():
+        llm = ScriptedChatModel(script=script, openai_api_key="test")  # type: ignore
+        async with CodeBoxPool(min_size=1, max_size=1, factory=FakeCodeBox) as pool:
+            async with CodeInterpreterSession(llm=llm, pool=pool, **kwargs) as session:
+                response = await session.generate_response(user_msg)
+        return llm, response
+
+    return asyncio.run(turn())
+
+
+def test_plain_answer_takes_one_llm_call():
+    llm, response = run_turn(["1 + 1 is 2."])
+    assert response.content == "1 + 1 is 2."
+    assert llm.calls == 1
+    assert llm.auxiliary_calls == 0
+
+
+def test_run_without_file_writes_takes_no_extra_llm_call():
+    llm, response = run_turn([{"code": "print(1 + 1)"}, "1 + 1 is 2."])
+    assert response.content == "1 + 1 is 2."
+    assert response.files == []
+    # the function call and the final answer, no file modification check
+    assert llm.calls == 2
+    assert llm.auxiliary_calls == 0
+
+
+def test_written_file_gets_downloaded():
+    code = "with open('result.txt', 'w') as f:\n    f.write('2')"
+    llm, response = run_turn([{"code": code}, "I saved the result."])
+    assert [file.name for file in response.files] == ["result.txt"]
+    assert response.files[0].content == b"2"
+    assert llm.calls == 2
+
+
+def test_snapshot_finds_writes_hidden_from_static_analysis():
+    code = "import pathlib\nwrite = pathlib.Path('hidden.txt').write_text\nwrite('1')"
+    llm, response = run_turn([{"code": code}, "Done."], file_detection="snapshot")
+    assert [file.name for file in response.files] == ["hidden.txt"]
+    # no LLM fallback of the file detection
+    assert llm.auxiliary_calls == 0
+
+
+def test_download_links_get_removed_once_per_turn():
+    code = "with open('result.csv', 'w') as f:\n    f.write('1,2')"
+    answer = (
+        "I saved the result, you can [download it here](sandbox:/result.csv). "
+        "See [the docs](https://pandas.pydata.org) for the format."
+    )
+    llm, response = run_turn([{"code": code}, answer], llm_link_removal=True)
+    assert [file.name for file in response.files] == ["result.csv"]
+    assert "sandbox:" not in response.content
+    # the link left after stripping the sandbox link goes through the LLM once
+    assert llm.auxiliary_calls == 1
+    assert llm.calls == 3
+
+
+class NoCopyCodeBox(FakeCodeBox):
+    async def arun(self, code):
+        if "copyfile" in code:
+            raise ConnectionError("connection lost")
+        return await super().arun(code)
+
+
+def run_uploads(factory, turns: list[list[File]], **kwargs) -> int:
+    """Bytes uploaded over the turns, each sending the given files."""
+
+    async def run():
+        llm = ScriptedChatModel(
+            script=[{"code": "print(1)"}, "Done."], openai_api_key="test"
+        )  # type: ignore
+        async with CodeBoxPool(min_size=1, max_size=1, factory=factory) as pool:
+            async with CodeInterpreterSession(llm=llm, pool=pool, **kwargs) as session:
+                for files in turns:
+                    await session.generate_response("Look at it.", files=files)
+                return session.codebox.bytes_uploaded  # type: ignore
+
+    return asyncio.run(run())
+
+
+def test_static_detection_keeps_the_upload_dedup():
+    data = File(name="data.csv", content=b"1,2,3\n" * 10)
+    uploaded = run_uploads(FakeCodeBox, [[data], [data]], file_detection="static")
+    assert uploaded == data.size
+
+
+def test_failed_copy_falls_back_to_an_upload():
+    content = b"1,2,3\n" * 10
+    files = [File(name="a.csv", content=content), File(name="b.csv", content=content)]
+    assert run_uploads(NoCopyCodeBox, [files[:1], files[1:]]) == 2 * len(content)
+    assert run_uploads(FakeCodeBox, [files[:1], files[1:]]) == len(content)
+
+
+def test_last_stopped_session_closes_the_http_session():
+    async def run():
+        llm = ScriptedChatModel(script=["Done."], openai_api_key="test")  # type: ignore
+        async with CodeBoxPool(min_size=2, max_size=2, factory=FakeCodeBox) as pool:
+            first = CodeInterpreterSession(llm=llm, pool=pool)
+            second = CodeInterpreterSession(llm=llm, pool=pool)
+            await first.astart()
+            await second.astart()
+            http = await get_http_session()
+            await first.astop()
+            assert not http.closed
+            await second.astop()
+            return http.closed
+
+    assert asyncio.run(run())